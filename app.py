@@ -1,36 +1,54 @@
+import argparse
+import csv
+import hashlib
+import json
+import multiprocessing
 import os
+import secrets
 import sqlite3
+import subprocess
+import sys
 import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FuturesTimeout
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
 from functools import wraps
-from flask import Flask, render_template, request, jsonify, send_file, session, redirect, url_for, g
-from io import BytesIO
-from flask_socketio import SocketIO
-import pandas as pd
+from flask import Flask, Response, make_response, render_template, request, jsonify, send_file, session, redirect, url_for, g, stream_with_context
+from io import BytesIO, StringIO
+from flask_socketio import SocketIO, join_room, leave_room, rooms
 from werkzeug.utils import secure_filename
 from werkzeug.security import check_password_hash, generate_password_hash
 import unicodedata
-
-# Opcional PDF
-try:
-    from matplotlib.backends.backend_pdf import PdfPages
-    import matplotlib.pyplot as plt
-    HAS_MPL = True
-except ImportError:
-    HAS_MPL = False
+import click
+from mensajeria import LocalBroker, LocalBrokerManager
+import reportes
 
 UPLOAD_FOLDER = 'uploads'
 ALLOWED_EXT = {'xls', 'xlsx'}
 DB_PATH = 'db.sqlite'
 
-db_lock = threading.Lock()
-
 app = Flask(__name__)
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.secret_key = os.environ.get('SECRET_KEY', 'dev-secret')
 
 # Python 3.12 does not support eventlet; use threading for SocketIO
 # Ensure python-socketio and flask-socketio are 5.x for compatibility
-socketio = SocketIO(app, async_mode="threading")
+# Con varios workers (python app.py --workers N) cada proceso recibe la
+# dirección del broker en SOCKETIO_BROKER=host:puerto y publica ahí sus
+# eventos, para que lleguen también a los clientes conectados a otro worker.
+# SOCKETIO_BROKER_KEY (hex) es la clave aleatoria que lanzar_workers genera en
+# cada arranque: el broker transporta objetos serializados con pickle.
+BROKER = os.environ.get('SOCKETIO_BROKER')
+client_manager = None
+if BROKER:
+    _host, _port = BROKER.rsplit(':', 1)
+    client_manager = LocalBrokerManager((_host, int(_port)),
+                                        authkey=bytes.fromhex(os.environ['SOCKETIO_BROKER_KEY']))
+socketio_kwargs = {'client_manager': client_manager} if client_manager else {}
+socketio = SocketIO(app, async_mode="threading", **socketio_kwargs)
 
 PANEL_ROUTES = {
     'admin': 'panel_admin',
@@ -39,33 +57,869 @@ PANEL_ROUTES = {
 }
 
 ALLOWED_ESTADOS = ('PRESENCIAL', 'VIRTUAL', 'AUSENTE')
+ESTADOS_ACTIVOS = ('PRESENCIAL', 'VIRTUAL')
 
 # --- Helpers ---
 
+class ConnectionPool:
+    """Pool de conexiones SQLite configuradas una sola vez y reutilizadas entre peticiones."""
+
+    def __init__(self, path, max_size=32, timeout=30, cached_statements=256):
+        self.path = path
+        self.max_size = max_size
+        self.timeout = timeout
+        self.cached_statements = cached_statements
+        self._idle = []
+        self._open = 0
+        self._cond = threading.Condition()
+        self._hits = 0
+        self._misses = 0
+        self._waits = 0
+        self._wait_time = 0.0
+
+    def _connect(self):
+        # cached_statements mantiene las sentencias preparadas entre peticiones
+        conn = sqlite3.connect(self.path, timeout=self.timeout, check_same_thread=False,
+                               cached_statements=self.cached_statements)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA foreign_keys = ON')
+        return conn
+
+    def acquire(self):
+        with self._cond:
+            if not self._idle and self._open >= self.max_size:
+                self._waits += 1
+                inicio = time.perf_counter()
+                if not self._cond.wait_for(lambda: self._idle or self._open < self.max_size, self.timeout):
+                    raise sqlite3.OperationalError('Pool de conexiones agotado')
+                self._wait_time += time.perf_counter() - inicio
+            if self._idle:
+                self._hits += 1
+                return self._idle.pop()
+            self._open += 1
+            self._misses += 1
+        try:
+            return self._connect()
+        except Exception:
+            self._discard()
+            raise
+
+    def release(self, conn):
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            conn.close()
+            self._discard()
+            return
+        with self._cond:
+            self._idle.append(conn)
+            self._cond.notify()
+
+    def _discard(self):
+        with self._cond:
+            self._open -= 1
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        """Conexión prestada solo durante el bloque (hilos de fondo, scripts o
+        lecturas que no deben retenerla hasta el final de la petición)."""
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def stats(self):
+        with self._cond:
+            return {
+                'hits': self._hits,
+                'misses': self._misses,
+                'waits': self._waits,
+                'wait_time_ms': round(self._wait_time * 1000, 3),
+                'open': self._open,
+                'idle': len(self._idle),
+                'in_use': self._open - len(self._idle),
+                'max_size': self.max_size,
+            }
+
+
+pool = ConnectionPool(DB_PATH, max_size=int(os.environ.get('DB_POOL_SIZE', 32)))
+
+
 def get_conn():
-    conn = sqlite3.connect(DB_PATH, timeout=30, check_same_thread=False)
-    conn.row_factory = sqlite3.Row
-    conn.execute('PRAGMA journal_mode=WAL')
-    conn.execute('PRAGMA foreign_keys = ON')
+    """Devuelve la conexión del pool asignada a la petición actual."""
+    conn = g.get('db_conn')
+    if conn is None:
+        conn = g.db_conn = pool.acquire()
     return conn
 
 
-def resumen_acciones(votacion_id=None):
-    """Calcula totales de acciones por estado para una votación."""
-    conn = get_conn()
+@app.teardown_appcontext
+def release_conn(exc):
+    conn = g.pop('db_conn', None)
+    if conn is not None:
+        pool.release(conn)
+
+
+class WriteCoordinator:
+    """Coordina las escrituras por votación usando el bloqueo propio de SQLite.
+
+    No hay mutex de Python: cada escritura abre ``BEGIN IMMEDIATE`` y deja que
+    SQLite (WAL + busy_timeout) serialice a los escritores. El BEGIN usa un
+    busy_timeout corto (``espera_ms``) en lugar del de la conexión, de modo que
+    la espera total queda acotada a unos ``(retries + 1) * espera_ms`` más el
+    backoff. Las esperas se registran por votación para poder medirlas; las
+    escrituras sin votación (``votacion_id=None``) no se registran.
+    """
+
+    def __init__(self, retries=5, backoff=0.05, espera_ms=1000):
+        self.retries = retries
+        self.backoff = backoff
+        self.espera_ms = espera_ms
+        self._stats_lock = threading.Lock()  # solo protege los contadores
+        self._stats = {}
+
+    def _begin(self, conn):
+        anterior = conn.execute('PRAGMA busy_timeout').fetchone()[0]
+        conn.execute(f'PRAGMA busy_timeout = {int(self.espera_ms)}')
+        try:
+            intentos = 0
+            while True:
+                try:
+                    conn.execute('BEGIN IMMEDIATE')
+                    return intentos
+                except sqlite3.OperationalError as exc:
+                    msg = str(exc)
+                    if ('locked' not in msg and 'busy' not in msg) or intentos >= self.retries:
+                        raise
+                    intentos += 1
+                    time.sleep(self.backoff * intentos)
+        finally:
+            conn.execute(f'PRAGMA busy_timeout = {int(anterior)}')
+
+    @contextmanager
+    def transaction(self, votacion_id, conn=None):
+        """Transacción de escritura sobre ``conn`` (o la conexión de la petición)."""
+        conn = conn or get_conn()
+        inicio = time.perf_counter()
+        reintentos = self._begin(conn)
+        adquirido = time.perf_counter()
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        else:
+            conn.commit()
+        finally:
+            self._record(votacion_id, adquirido - inicio, time.perf_counter() - adquirido, reintentos)
+
+    def _record(self, votacion_id, espera, duracion, reintentos):
+        if votacion_id is None:
+            return
+        with self._stats_lock:
+            st = self._stats.setdefault(votacion_id, {
+                'transacciones': 0, 'reintentos': 0,
+                'espera_total_ms': 0.0, 'espera_max_ms': 0.0, 'duracion_max_ms': 0.0,
+            })
+            st['transacciones'] += 1
+            st['reintentos'] += reintentos
+            st['espera_total_ms'] += espera * 1000
+            st['espera_max_ms'] = max(st['espera_max_ms'], espera * 1000)
+            st['duracion_max_ms'] = max(st['duracion_max_ms'], duracion * 1000)
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                str(vid): {k: round(v, 3) if isinstance(v, float) else v for k, v in st.items()}
+                for vid, st in self._stats.items()
+            }
+
+
+writes = WriteCoordinator(espera_ms=int(os.environ.get('DB_ESPERA_ESCRITURA_MS', 1000)))
+
+
+class BoletaCache:
+    """Definición de preguntas y opciones por votación, cargada con un solo JOIN.
+
+    Se invalida explícitamente al editar o eliminar la votación; el ETag
+    permite responder 304 a clientes que ya la tienen.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._boletas = {}
+        self._generacion = 0
+
+    def get(self, votacion_id, conn=None):
+        with self._lock:
+            cached = self._boletas.get(votacion_id)
+            generacion = self._generacion
+        if cached:
+            return cached
+        conn = conn or get_conn()
+        rows = conn.execute(
+            '''SELECT p.id AS pregunta_id, p.texto AS pregunta, o.id AS opcion_id, o.texto AS opcion
+               FROM preguntas p LEFT JOIN opciones o ON o.pregunta_id = p.id
+               WHERE p.votacion_id = ?
+               ORDER BY p.id, o.id''',
+            (votacion_id,)
+        ).fetchall()
+        # Una votación que aún no existe no se guarda: su boleta vacía quedaría
+        # servida cuando se cree
+        existe = bool(rows) or conn.execute('SELECT 1 FROM votaciones WHERE id = ?', (votacion_id,)).fetchone()
+        preguntas = []
+        for r in rows:
+            if not preguntas or preguntas[-1]['id'] != r['pregunta_id']:
+                preguntas.append({'id': r['pregunta_id'], 'texto': r['pregunta'], 'opciones': []})
+            if r['opcion_id'] is not None:
+                preguntas[-1]['opciones'].append({'id': r['opcion_id'], 'texto': r['opcion']})
+        etag = hashlib.sha1(json.dumps(preguntas, sort_keys=True).encode()).hexdigest()
+        with self._lock:
+            # No guarda una lectura que pudo quedar obsoleta por una invalidación concurrente
+            if existe and generacion == self._generacion:
+                self._boletas[votacion_id] = (etag, preguntas)
+        return etag, preguntas
+
+    def invalidate(self, votacion_id):
+        with self._lock:
+            self._generacion += 1
+            self._boletas.pop(votacion_id, None)
+
+
+boletas = BoletaCache()
+
+
+class UsuarioCache:
+    """Usuarios autenticados por id, sin el hash de la contraseña.
+
+    Evita leer ``users`` en cada petición. Las altas y bajas lo invalidan
+    explícitamente; el TTL acota cuánto tarda en notarse un cambio hecho
+    fuera de la aplicación. También guarda los ids inexistentes, de modo que
+    una sesión de un usuario eliminado no consulta la base en cada petición.
+    """
+
+    def __init__(self, ttl=30):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._usuarios = {}
+        self._generacion = 0
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, user_id, conn_factory):
+        ahora = time.monotonic()
+        with self._lock:
+            entrada = self._usuarios.get(user_id)
+            if entrada and entrada[0] > ahora:
+                self._hits += 1
+                return entrada[1]
+            self._misses += 1
+            generacion = self._generacion
+        row = conn_factory().execute('SELECT * FROM users WHERE id = ?', (user_id,)).fetchone()
+        usuario = {k: row[k] for k in row.keys() if k != 'password'} if row else None
+        with self._lock:
+            # Igual que BoletaCache: una baja o un cambio de rol durante la
+            # lectura no debe dejar el usuario anterior en caché hasta el TTL
+            if generacion == self._generacion:
+                self._usuarios[user_id] = (ahora + self.ttl, usuario)
+        return usuario
+
+    def invalidate(self, user_id=None):
+        with self._lock:
+            self._generacion += 1
+            if user_id is None:
+                self._usuarios.clear()
+            else:
+                self._usuarios.pop(user_id, None)
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self._hits, 'misses': self._misses, 'en_cache': len(self._usuarios),
+                    'ttl_s': self.ttl}
+
+
+usuarios = UsuarioCache(ttl=float(os.environ.get('USUARIOS_TTL', 30)))
+
+
+class EjecutorProcesos:
+    """``ProcessPoolExecutor`` creado con el primer uso y rehecho si se rompe.
+
+    Usa el contexto 'spawn': bifurcar un proceso con hilos (Socket.IO, el
+    escritor de votos) puede dejar en el hijo locks tomados para siempre.
+    """
+
+    def __init__(self, procesos):
+        self.procesos = procesos
+        self._lock = threading.Lock()
+        self._ejecutor = None
+
+    def get(self):
+        with self._lock:
+            if self._ejecutor is None:
+                self._ejecutor = ProcessPoolExecutor(max_workers=self.procesos,
+                                                     mp_context=multiprocessing.get_context('spawn'))
+            return self._ejecutor
+
+    def descartar(self):
+        """Olvida el ejecutor tras ``BrokenProcessPool``; el siguiente uso crea otro."""
+        with self._lock:
+            self._ejecutor = None
+
+
+class PoolSaturado(Exception):
+    """La cola de ``HashPool`` está llena; el cliente debe reintentar más tarde."""
+
+
+class HashPool:
+    """Procesos dedicados a calcular y verificar hashes de contraseñas.
+
+    ``generate_password_hash`` y ``check_password_hash`` son lentos a
+    propósito; repartirlos entre procesos usa todos los núcleos y no ocupa los
+    hilos que atienden Socket.IO y los votos. ``max_pendientes`` limita cuántas
+    verificaciones pueden esperar turno: las que exceden el límite fallan al
+    momento con ``PoolSaturado`` en lugar de acumular hilos bloqueados.
+    """
+
+    def __init__(self, procesos=None, max_pendientes=None):
+        self.procesos = procesos or os.cpu_count() or 1
+        self.max_pendientes = max_pendientes or self.procesos * 8
+        self._lock = threading.Lock()
+        self._ejecutor = EjecutorProcesos(self.procesos)
+        self._generados = 0
+        self._verificados = 0
+        self._pendientes = 0
+        self._rechazados = 0
+
+    def generar(self, contrasenas):
+        """Produce los hashes de ``contrasenas`` en el mismo orden, calculados en paralelo."""
+        contrasenas = list(contrasenas)
+        if not contrasenas:
+            return
+        # Lotes pequeños: el primer resultado llega pronto y el reparto queda parejo
+        lote = max(1, len(contrasenas) // (self.procesos * 8))
+        try:
+            for hash_ in self._ejecutor.get().map(generate_password_hash, contrasenas, chunksize=lote):
+                with self._lock:
+                    self._generados += 1
+                yield hash_
+        except BrokenProcessPool:
+            self._ejecutor.descartar()
+            raise
+
+    def verificar(self, hash_, password, timeout=30):
+        """``check_password_hash`` en el pool; ``PoolSaturado`` si la cola está llena."""
+        with self._lock:
+            if self._pendientes >= self.max_pendientes:
+                self._rechazados += 1
+                raise PoolSaturado()
+            self._pendientes += 1
+        try:
+            futuro = self._ejecutor.get().submit(check_password_hash, hash_, password)
+            try:
+                return futuro.result(timeout=timeout)
+            except FuturesTimeout:
+                futuro.cancel()
+                raise PoolSaturado()
+        except BrokenProcessPool:
+            self._ejecutor.descartar()
+            raise
+        finally:
+            with self._lock:
+                self._pendientes -= 1
+                self._verificados += 1
+
+    def stats(self):
+        with self._lock:
+            return {'procesos': self.procesos, 'generados': self._generados,
+                    'verificados': self._verificados, 'pendientes': self._pendientes,
+                    'max_pendientes': self.max_pendientes, 'rechazados': self._rechazados}
+
+
+class Latencias:
+    """Últimas duraciones por operación, para calcular percentiles."""
+
+    def __init__(self, muestras=2000):
+        self.muestras = muestras
+        self._lock = threading.Lock()
+        self._tiempos = {}
+        self._totales = {}
+
+    def registrar(self, nombre, segundos):
+        with self._lock:
+            if nombre not in self._tiempos:
+                self._tiempos[nombre] = deque(maxlen=self.muestras)
+            self._tiempos[nombre].append(segundos * 1000)
+            self._totales[nombre] = self._totales.get(nombre, 0) + 1
+
+    def stats(self):
+        with self._lock:
+            copia = {k: sorted(v) for k, v in self._tiempos.items()}
+            totales = dict(self._totales)
+        resultado = {}
+        for nombre, tiempos in copia.items():
+            resultado[nombre] = {'total': totales[nombre], 'muestras': len(tiempos),
+                                 **{f'p{p}_ms': round(tiempos[min(len(tiempos) - 1, len(tiempos) * p // 100)], 1)
+                                    for p in (50, 90, 99)},
+                                 'max_ms': round(tiempos[-1], 1)}
+        return resultado
+
+
+hashes = HashPool(int(os.environ.get('HASH_PROCESOS', 0)) or None)
+# Pool propio para el login: una importación de usuarios no lo retrasa. Por
+# defecto usa la mitad de los núcleos y deja el resto al servidor.
+verificaciones = HashPool(int(os.environ.get('LOGIN_PROCESOS', 0)) or max(1, (os.cpu_count() or 1) // 2),
+                          int(os.environ.get('LOGIN_COLA', 0)) or None)
+latencias = Latencias()
+
+
+class PermisoIndex:
+    """Índice en memoria de ``usuarios_votacion``: usuario → {(votacion_id, rol)}.
+
+    Se carga completo con la primera consulta. Los handlers que modifican
+    asignaciones lo invalidan y la siguiente consulta lo vuelve a cargar; un
+    contador de generación evita guardar una carga que compitió con una
+    invalidación.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._por_usuario = None
+        self._generacion = 0
+        self._cargas = 0
+
+    def _indice(self, conn_factory):
+        with self._lock:
+            if self._por_usuario is not None:
+                return self._por_usuario
+            generacion = self._generacion
+        indice = {}
+        for r in conn_factory().execute('SELECT user_id, votacion_id, rol FROM usuarios_votacion'):
+            indice.setdefault(r['user_id'], set()).add((r['votacion_id'], r['rol']))
+        with self._lock:
+            self._cargas += 1
+            if generacion == self._generacion:
+                self._por_usuario = indice
+        return indice
+
+    def tiene(self, user_id, votacion_id, rol=None, conn_factory=None):
+        """Indica si el usuario está asignado a la votación (con ``rol``, si se indica)."""
+        asignaciones = self._indice(conn_factory or get_conn).get(user_id, ())
+        if rol is not None:
+            return (votacion_id, rol) in asignaciones
+        return any(v == votacion_id for v, _ in asignaciones)
+
+    def invalidate(self, _clave=None):
+        with self._lock:
+            self._generacion += 1
+            self._por_usuario = None
+
+    def stats(self):
+        with self._lock:
+            return {'cargas': self._cargas,
+                    'usuarios': len(self._por_usuario) if self._por_usuario is not None else None}
+
+
+permisos = PermisoIndex()
+
+
+class VotoRechazado(Exception):
+    """Voto que no cumple las reglas del padrón; ``status`` es el código HTTP."""
+
+    def __init__(self, mensaje, status=400):
+        super().__init__(mensaje)
+        self.status = status
+
+
+class PadronIndex:
+    """Padrón de cada votación en memoria: asistencia id → (acciones, estado).
+
+    También guarda qué asistentes ya votaron cada pregunta, de modo que un voto
+    se valida (peso, presencia y duplicado) sin consultar la base. Se carga
+    con el primer voto de la votación; los cambios de estado se aplican en el
+    lugar y las importaciones lo invalidan. El índice único
+    ``(pregunta_id, asistencia_id)`` de ``votos`` cubre lo que escape a la
+    memoria (otro worker, una recarga concurrente). Una votación con votos no
+    admite reimportar la asistencia (``AsistenciaConVotos``), así que los ids
+    no cambian bajo los votos ya emitidos.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._votaciones = {}
+        self._generacion = {}
+        self._cargas = 0
+
+    def _padron(self, votacion_id, conn):
+        while True:
+            with self._lock:
+                padron = self._votaciones.get(votacion_id)
+                if padron is not None:
+                    return padron
+                generacion = self._generacion.get(votacion_id, 0)
+            asistentes = {r[0]: (r[1], r[2]) for r in conn.execute(
+                'SELECT id, acciones, estado FROM asistencia WHERE votacion_id=?', (votacion_id,))}
+            votados = {}
+            for r in conn.execute('SELECT pregunta_id, asistencia_id FROM votos '
+                                  'WHERE votacion_id=? AND asistencia_id IS NOT NULL', (votacion_id,)):
+                votados.setdefault(r[0], set()).add(r[1])
+            with self._lock:
+                self._cargas += 1
+                # Un cambio de estado o una invalidación durante la lectura deja
+                # la copia obsoleta: se descarta y se vuelve a leer
+                if generacion == self._generacion.get(votacion_id, 0):
+                    return self._votaciones.setdefault(
+                        votacion_id, {'asistentes': asistentes, 'votados': votados})
+
+    def reservar(self, votacion_id, pregunta_id, votos, conn):
+        """Valida ``votos`` (``(asistencia_id, acciones_enviadas)``) y los marca como emitidos.
+
+        Devuelve las acciones de cada asistente según el padrón; lanza
+        ``VotoRechazado`` sin marcar ninguno si alguno no es válido.
+        """
+        padron = self._padron(votacion_id, conn)
+        ids = [a for a, _ in votos]
+        if len(set(ids)) != len(ids):
+            raise VotoRechazado('Asistente repetido en los votos')
+        with self._lock:
+            ya_votaron = padron['votados'].setdefault(pregunta_id, set())
+            pesos = []
+            for asistencia_id, acciones in votos:
+                registro = padron['asistentes'].get(asistencia_id)
+                if registro is None:
+                    raise VotoRechazado('Asistente no registrado en la votación')
+                if registro[1] not in ESTADOS_ACTIVOS:
+                    raise VotoRechazado('El asistente no está presente')
+                if acciones is not None and acciones != registro[0]:
+                    raise VotoRechazado('Las acciones no coinciden con el registro de asistencia')
+                if asistencia_id in ya_votaron:
+                    raise VotoRechazado('El asistente ya votó esta pregunta', 409)
+                pesos.append(registro[0])
+            ya_votaron.update(ids)
+        return pesos
+
+    def liberar(self, votacion_id, pregunta_id, ids):
+        """Deshace ``reservar`` cuando la inserción no llegó a confirmarse."""
+        with self._lock:
+            padron = self._votaciones.get(votacion_id)
+            if padron is not None:
+                padron['votados'].get(pregunta_id, set()).difference_update(ids)
+
+    def estados(self, votacion_id, cambios=None, todos=None):
+        """Aplica cambios de estado ya confirmados (mismos argumentos que ``EventCoalescer.estados``)."""
+        with self._lock:
+            padron = self._votaciones.get(votacion_id)
+            if padron is None:
+                # Si hay una carga en curso pudo leer el estado anterior: que la descarte
+                self._generacion[votacion_id] = self._generacion.get(votacion_id, 0) + 1
+                return
+            asistentes = padron['asistentes']
+            for asistencia_id, estado in (((a, todos) for a in asistentes) if todos else (cambios or {}).items()):
+                if asistencia_id in asistentes:
+                    asistentes[asistencia_id] = (asistentes[asistencia_id][0], estado)
+
+    def invalidate(self, votacion_id=None):
+        with self._lock:
+            if votacion_id is None:
+                self._votaciones.clear()
+                self._generacion = {k: v + 1 for k, v in self._generacion.items()}
+                return
+            self._generacion[votacion_id] = self._generacion.get(votacion_id, 0) + 1
+            self._votaciones.pop(votacion_id, None)
+
+    def stats(self):
+        with self._lock:
+            return {'cargas': self._cargas, 'votaciones': len(self._votaciones),
+                    'asistentes': sum(len(p['asistentes']) for p in self._votaciones.values())}
+
+
+padron = PadronIndex()
+
+# Cachés por proceso que otro worker puede dejar obsoletas
+CACHES = {
+    'boletas': boletas.invalidate,
+    'usuarios': usuarios.invalidate,
+    'permisos': permisos.invalidate,
+    'padron': padron.invalidate,
+}
+
+def invalidar_cache(nombre, clave):
+    """Invalida una caché local y avisa al resto de workers, si los hay."""
+    CACHES[nombre](clave)
+    if client_manager:
+        client_manager.publicar('invalidar', cache=nombre, clave=clave)
+
+def actualizar_padron(votacion_id, cambios=None, todos=None):
+    """Aplica un cambio de estado al padrón local; los demás workers lo recargan."""
+    padron.estados(votacion_id, cambios, todos)
+    if client_manager:
+        client_manager.publicar('invalidar', cache='padron', clave=votacion_id)
+
+if client_manager:
+    client_manager.handlers['invalidar'] = lambda msg: CACHES[msg['cache']](msg['clave'])
+
+def escuchar_broker():
+    """Arranca ya el hilo que recibe los mensajes del broker.
+
+    python-socketio lo arranca con la primera conexión Socket.IO; un worker
+    que solo ha servido HTTP no recibiría las invalidaciones de caché.
+    """
+    if client_manager and not socketio.server.manager_initialized:
+        socketio.server.manager_initialized = True
+        client_manager.initialize()
+
+
+def version_asistencia(conn, votacion_id):
+    """Devuelve ``(version, reinicio)`` de la asistencia de una votación.
+
+    ``version`` crece con cada transacción que cambia filas; ``reinicio`` es la
+    versión de la última recarga completa (importación), anterior a la cual
+    no se pueden calcular diferencias.
+    """
+    row = conn.execute('SELECT version, reinicio FROM asistencia_versiones WHERE votacion_id=?',
+                       (votacion_id,)).fetchone()
+    return (row['version'], row['reinicio']) if row else (0, 0)
+
+def registrar_version(conn, votacion_id, version, reinicio=False):
+    """Guarda la nueva versión dentro de la transacción de escritura en curso."""
+    conn.execute(
+        '''INSERT INTO asistencia_versiones (votacion_id, version, reinicio) VALUES (?, ?, ?)
+           ON CONFLICT(votacion_id) DO UPDATE SET version = excluded.version,
+               reinicio = CASE WHEN ? THEN excluded.version ELSE reinicio END''',
+        (votacion_id, version, version if reinicio else 0, reinicio)
+    )
+
+def sala(votacion_id):
+    """Sala de Socket.IO con los clientes de una votación."""
+    return f'votacion_{votacion_id}'
+
+
+class EventCoalescer:
+    """Agrupa los eventos de cada votación que llegan dentro de una ventana corta.
+
+    Los cambios de estado se fusionan por id (gana el último) y los votos se
+    suman por opción; al cerrar la ventana se emite un único mensaje por
+    votación y tipo de evento, solo a la sala de esa votación.
+    """
+
+    def __init__(self, socketio, ventana=0.1):
+        self.socketio = socketio
+        self.ventana = ventana
+        self._lock = threading.Lock()
+        self._estados = {}
+        self._votos = {}
+        self._programado = False
+        self._recibidos = 0
+        self._emitidos = 0
+
+    def estados(self, votacion_id, cambios=None, todos=None, version=None):
+        """``version``: versión de asistencia que produjo el cambio.
+
+        El mensaje lleva ``desde`` (versión previa al primer cambio fusionado)
+        y ``version``; un cliente cuya versión sea menor que ``desde`` se perdió
+        algún cambio y debe pedir ``/api/asistencia?since=``.
+        """
+        with self._lock:
+            pendiente = self._estados.setdefault(votacion_id, {'todos': None, 'cambios': {},
+                                                               'desde': None, 'version': None})
+            if todos:
+                pendiente['todos'] = todos
+                pendiente['cambios'].clear()
+            pendiente['cambios'].update(cambios or {})
+            if version is not None:
+                if pendiente['desde'] is None or version - 1 < pendiente['desde']:
+                    pendiente['desde'] = version - 1
+                pendiente['version'] = max(version, pendiente['version'] or 0)
+            self._agendar()
+
+    def votos(self, votacion_id, totales):
+        """``totales``: iterable de ``(pregunta_id, opcion_id, acciones, votos)``."""
+        with self._lock:
+            pendiente = self._votos.setdefault(votacion_id, {})
+            for pregunta_id, opcion_id, acciones, votos in totales:
+                t = pendiente.setdefault(opcion_id, {'pregunta_id': pregunta_id, 'opcion_id': opcion_id,
+                                                     'acciones': 0, 'votos': 0})
+                t['acciones'] += acciones
+                t['votos'] += votos
+            self._agendar()
+
+    def _agendar(self):
+        self._recibidos += 1
+        if not self._programado:
+            self._programado = True
+            self.socketio.start_background_task(self._vaciar_luego)
+
+    def _vaciar_luego(self):
+        self.socketio.sleep(self.ventana)
+        self.flush()
+
+    def flush(self):
+        with self._lock:
+            estados, self._estados = self._estados, {}
+            votos, self._votos = self._votos, {}
+            self._programado = False
+            self._emitidos += len(estados) + len(votos)
+        for votacion_id, p in estados.items():
+            por_estado = {}
+            for id, estado in p['cambios'].items():
+                por_estado.setdefault(estado, []).append(id)
+            evento = {'votacion_id': votacion_id, 'cambios': por_estado}
+            if p['todos']:
+                evento['todos'] = p['todos']
+            if p['version'] is not None:
+                evento['desde'], evento['version'] = p['desde'], p['version']
+            self.socketio.emit('estados_changed', evento, to=sala(votacion_id))
+        for votacion_id, totales in votos.items():
+            self.socketio.emit('voto_registrado', {'votacion_id': votacion_id, 'totales': list(totales.values())},
+                               to=sala(votacion_id))
+
+    def stats(self):
+        with self._lock:
+            return {'eventos_recibidos': self._recibidos, 'mensajes_emitidos': self._emitidos,
+                    'ventana_ms': self.ventana * 1000}
+
+
+eventos = EventCoalescer(socketio, ventana=float(os.environ.get('EVENTOS_VENTANA_MS', 100)) / 1000)
+
+
+class VotoBuffer:
+    """Escritura agrupada de votos (group commit).
+
+    Las peticiones encolan sus filas y esperan; un hilo escritor las inserta
+    juntas en una sola transacción cuando pasan ``ventana`` segundos desde la
+    primera pendiente o se juntan ``max_votos`` filas. Cada petición responde
+    después del COMMIT que incluye su voto, así que un voto confirmado al
+    cliente ya está en disco, pero el fsync se paga una vez por grupo.
+    """
+
+    def __init__(self, ventana=0.005, max_votos=500, timeout=10):
+        self.ventana = ventana
+        self.max_votos = max_votos
+        self.timeout = timeout
+        self._cond = threading.Condition()
+        self._pendientes = []
+        self._filas_pendientes = 0
+        self._hilo = None
+        self._grupos = 0
+        self._votos = 0
+        self._max_grupo = 0
+        self._reintentos_individuales = 0
+
+    def registrar(self, filas):
+        """Inserta ``filas`` (tuplas de ``INSERT_VOTO``) y espera a que sean durables.
+
+        Propaga la excepción de la base si la transacción de estas filas falla.
+        """
+        pedido = {'filas': filas, 'listo': threading.Event(), 'error': None}
+        with self._cond:
+            if self._hilo is None:
+                self._hilo = threading.Thread(target=self._escribir, name='votos-group-commit', daemon=True)
+                self._hilo.start()
+            self._pendientes.append(pedido)
+            self._filas_pendientes += len(filas)
+            self._cond.notify()
+        if not pedido['listo'].wait(self.timeout):
+            raise TimeoutError('El voto no se confirmó a tiempo')
+        if pedido['error'] is not None:
+            raise pedido['error']
+
+    def _tomar_grupo(self):
+        with self._cond:
+            while not self._pendientes:
+                self._cond.wait()
+            limite = time.monotonic() + self.ventana
+            while self._filas_pendientes < self.max_votos:
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    break
+                self._cond.wait(restante)
+            grupo, self._pendientes, self._filas_pendientes = self._pendientes, [], 0
+            return grupo
+
+    def _escribir(self):
+        # Conexión propia, fuera del pool: las peticiones que esperan su voto
+        # retienen conexiones del pool y podrían agotarlo
+        conn = None
+        while True:
+            grupo = self._tomar_grupo()
+            try:
+                if conn is None:
+                    conn = pool._connect()
+                try:
+                    with writes.transaction(None, conn):
+                        conn.executemany(INSERT_VOTO, [f for p in grupo for f in p['filas']])
+                except sqlite3.IntegrityError:
+                    # Una fila inválida no debe tumbar el grupo: cada pedido por separado
+                    with self._cond:
+                        self._reintentos_individuales += 1
+                    for pedido in grupo:
+                        try:
+                            with writes.transaction(None, conn):
+                                conn.executemany(INSERT_VOTO, pedido['filas'])
+                        except sqlite3.IntegrityError as exc:
+                            pedido['error'] = exc
+            except Exception as exc:  # base bloqueada, disco lleno...
+                for pedido in grupo:
+                    pedido['error'] = pedido['error'] or exc
+                if conn is not None:
+                    conn.close()
+                    conn = None
+            filas = sum(len(p['filas']) for p in grupo)
+            with self._cond:
+                self._grupos += 1
+                self._votos += filas
+                self._max_grupo = max(self._max_grupo, filas)
+            for pedido in grupo:
+                pedido['listo'].set()
+
+    def stats(self):
+        with self._cond:
+            return {'grupos': self._grupos, 'votos': self._votos, 'max_grupo': self._max_grupo,
+                    'media_grupo': round(self._votos / self._grupos, 1) if self._grupos else 0,
+                    'pendientes': self._filas_pendientes, 'ventana_ms': self.ventana * 1000,
+                    'reintentos_individuales': self._reintentos_individuales}
+
+
+INSERT_VOTO = ('INSERT INTO votos (votacion_id, pregunta_id, opcion_id, acciones, user_id, asistencia_id) '
+               'VALUES (?,?,?,?,?,?)')
+
+# Desactivado por defecto: VOTOS_GRUPO_MS=5 agrupa los votos que llegan en 5 ms
+votos_buffer = VotoBuffer(float(os.environ['VOTOS_GRUPO_MS']) / 1000,
+                          int(os.environ.get('VOTOS_GRUPO_MAX', 500))) \
+    if os.environ.get('VOTOS_GRUPO_MS') else None
+
+def insertar_votos(votacion_id, filas, conn=None):
+    """Inserta votos directamente o, si está activo, a través de ``votos_buffer``."""
+    if votos_buffer:
+        votos_buffer.registrar(filas)
+        return
+    with writes.transaction(votacion_id, conn) as conn:
+        conn.executemany(INSERT_VOTO, filas)
+
+
+def resumen_acciones(votacion_id=None, conn=None):
+    """Calcula totales de acciones por estado para una votación.
+
+    Reutiliza la conexión recibida (o la de la petición) en lugar de abrir otra.
+    """
+    conn = conn or get_conn()
+    # Lee los contadores de asistencia_resumen (mantenidos por triggers) en vez
+    # de recorrer toda la tabla asistencia
     if votacion_id is None:
         rows = conn.execute(
-            'SELECT estado, SUM(acciones) AS acciones FROM asistencia GROUP BY estado'
+            'SELECT estado, SUM(acciones) AS acciones FROM asistencia_resumen WHERE registros > 0 GROUP BY estado'
         ).fetchall()
     else:
         rows = conn.execute(
-            'SELECT estado, SUM(acciones) AS acciones FROM asistencia WHERE votacion_id=? GROUP BY estado',
+            'SELECT estado, acciones FROM asistencia_resumen WHERE votacion_id=? AND registros > 0',
             (votacion_id,)
         ).fetchall()
-    conn.close()
     data = {r['estado']: r['acciones'] or 0 for r in rows}
     total = sum(data.values())
-    activos = sum(v for e, v in data.items() if e in ('PRESENCIAL', 'VIRTUAL'))
+    activos = sum(v for e, v in data.items() if e in ESTADOS_ACTIVOS)
     return total, activos, data
 
 @app.before_request
@@ -73,9 +927,7 @@ def load_user():
     g.user = None
     uid = session.get('user_id')
     if uid:
-        conn = get_conn()
-        g.user = conn.execute('SELECT * FROM users WHERE id = ?', (uid,)).fetchone()
-        conn.close()
+        g.user = usuarios.get(uid, get_conn)
 
 def login_required(f):
     @wraps(f)
@@ -85,6 +937,19 @@ def login_required(f):
         return f(*args, **kwargs)
     return wrapper
 
+def medir_latencia(nombre):
+    """Registra en ``latencias`` la duración de cada llamada a la vista."""
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            inicio = time.perf_counter()
+            try:
+                return f(*args, **kwargs)
+            finally:
+                latencias.registrar(nombre, time.perf_counter() - inicio)
+        return wrapper
+    return decorator
+
 def requires_role(*roles):
     def decorator(f):
         @wraps(f)
@@ -97,20 +962,39 @@ def requires_role(*roles):
 
 # --- Autenticación ---
 
+LOGIN_REINTENTO_S = 2
+
 @app.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
-        username = request.form.get('username')
-        password = request.form.get('password')
-        conn = get_conn()
+        inicio = time.perf_counter()
+        try:
+            return _iniciar_sesion()
+        finally:
+            latencias.registrar('login', time.perf_counter() - inicio)
+    return render_template('login.html')
+
+def _iniciar_sesion():
+    """Verifica las credenciales en ``verificaciones``; 503 si el pool está saturado."""
+    username = request.form.get('username')
+    password = request.form.get('password')
+    # Conexión solo para la lectura: get_conn() la retendría durante la
+    # verificación y una avalancha de ingresos agotaría el pool de la base
+    with pool.connection() as conn:
         user = conn.execute('SELECT * FROM users WHERE username = ?', (username,)).fetchone()
-        conn.close()
-        if user and check_password_hash(user['password'], password):
+    if user:
+        try:
+            valida = verificaciones.verificar(user['password'], password or '')
+        except PoolSaturado:
+            resp = make_response(render_template(
+                'login.html', error='Hay muchos ingresos en este momento; intente de nuevo en unos segundos'), 503)
+            resp.headers['Retry-After'] = str(LOGIN_REINTENTO_S)
+            return resp
+        if valida:
             session['user_id'] = user['id']
             route = PANEL_ROUTES.get(user['role'])
             return redirect(url_for(route)) if route else redirect(url_for('login'))
-        return render_template('login.html', error='Credenciales inválidas')
-    return render_template('login.html')
+    return render_template('login.html', error='Credenciales inválidas')
 
 @app.route('/logout')
 @login_required
@@ -137,31 +1021,12 @@ def panel_redirect():
 @login_required
 @requires_role('admin')
 def panel_admin():
-    """Panel principal del administrador con secciones de usuarios y votaciones."""
-    conn = get_conn()
-    users = conn.execute('''
-        SELECT u.id, u.username, u.cedula, u.role,
-               COALESCE(GROUP_CONCAT(v.nombre, ', '), '') AS votaciones
-        FROM users u
-        LEFT JOIN usuarios_votacion vu ON vu.user_id = u.id
-        LEFT JOIN votaciones v ON v.id = vu.votacion_id
-        GROUP BY u.id
-    ''').fetchall()
-    votaciones = conn.execute('''
-        SELECT v.id, v.nombre, v.fecha, v.quorum_minimo,
-               COUNT(DISTINCT p.id) AS num_preguntas,
-               COUNT(DISTINCT CASE WHEN vu.rol = 'asistencia' THEN vu.user_id END) AS asistentes,
-               COUNT(DISTINCT CASE WHEN vu.rol = 'votante' THEN vu.user_id END) AS votantes,
-               GROUP_CONCAT(DISTINCT CASE WHEN vu.rol = 'asistencia' THEN u.username END) AS asistentes_nombres,
-               GROUP_CONCAT(DISTINCT CASE WHEN vu.rol = 'votante' THEN u.username END) AS votantes_nombres
-        FROM votaciones v
-        LEFT JOIN preguntas p ON p.votacion_id = v.id
-        LEFT JOIN usuarios_votacion vu ON vu.votacion_id = v.id
-        LEFT JOIN users u ON vu.user_id = u.id
-        GROUP BY v.id
-    ''').fetchall()
-    conn.close()
-    return render_template('panel_admin.html', users=users, votaciones=votaciones)
+    """Panel principal del administrador con secciones de usuarios y votaciones.
+
+    Las tablas se cargan desde ``/api/admin/usuarios`` y ``/api/admin/votaciones``
+    (ver ``static/js/admin.js``).
+    """
+    return render_template('panel_admin.html')
 
 @app.route('/panel_asistencia')
 @login_required
@@ -173,7 +1038,6 @@ def panel_asistencia():
                                  JOIN usuarios_votacion vu ON v.id = vu.votacion_id
                                  WHERE vu.user_id = ? AND vu.rol = ? ''',
                                (g.user['id'], rol)).fetchall()
-    conn.close()
     readonly = g.user['role'] == 'votante'
     return render_template('asistencia_panel.html', votaciones=votaciones, readonly=readonly)
 
@@ -188,10 +1052,9 @@ def panel_votacion():
                          (g.user['id'],)).fetchall()
     votaciones = []
     for v in rows:
-        total, activos, _ = resumen_acciones(v['id'])
+        total, activos, _ = resumen_acciones(v['id'], conn)
         pct = (activos / total * 100) if total else 0
         votaciones.append({**dict(v), 'quorum_ok': pct >= (v['quorum_minimo'] or 0), 'porcentaje': pct})
-    conn.close()
     return render_template('votante_panel.html', votaciones=votaciones)
 
 @app.route('/votacion/<int:votacion_id>')
@@ -199,19 +1062,15 @@ def panel_votacion():
 @requires_role('votante')
 def iniciar_votacion(votacion_id):
     conn = get_conn()
-    row = conn.execute('''SELECT v.* FROM votaciones v
-                           JOIN usuarios_votacion vu ON v.id=vu.votacion_id
-                           WHERE v.id=? AND vu.user_id=? AND vu.rol='votante' ''',
-                         (votacion_id, g.user['id'])).fetchone()
+    if not permisos.tiene(g.user['id'], votacion_id, 'votante'):
+        return redirect(url_for('panel_votacion'))
+    row = conn.execute('SELECT * FROM votaciones WHERE id=?', (votacion_id,)).fetchone()
     if not row:
-        conn.close()
         return redirect(url_for('panel_votacion'))
-    total, activos, _ = resumen_acciones(votacion_id)
+    total, activos, _ = resumen_acciones(votacion_id, conn)
     pct = (activos / total * 100) if total else 0
     if pct < (row['quorum_minimo'] or 0):
-        conn.close()
         return redirect(url_for('panel_votacion'))
-    conn.close()
     return render_template('votacion_registro.html', votacion=row)
 
 @app.route('/api/votacion/<int:votacion_id>/preguntas')
@@ -219,36 +1078,141 @@ def iniciar_votacion(votacion_id):
 @requires_role('votante')
 def preguntas_votacion(votacion_id):
     conn = get_conn()
-    perm = conn.execute('SELECT 1 FROM usuarios_votacion WHERE votacion_id=? AND user_id=? AND rol="votante"', (votacion_id, g.user['id'])).fetchone()
-    if not perm:
-        conn.close()
+    if not permisos.tiene(g.user['id'], votacion_id, 'votante'):
         return jsonify([]), 403
-    rows = conn.execute('SELECT id, texto FROM preguntas WHERE votacion_id=?', (votacion_id,)).fetchall()
-    data = []
-    for p in rows:
-        opts = conn.execute('SELECT id, texto FROM opciones WHERE pregunta_id=?', (p['id'],)).fetchall()
-        data.append({'id': p['id'], 'texto': p['texto'], 'opciones': [dict(o) for o in opts]})
-    conn.close()
-    return jsonify(data)
+    etag, data = boletas.get(votacion_id, conn)
+    resp = jsonify(data)
+    resp.set_etag(etag)
+    resp.headers['Cache-Control'] = 'private, no-cache'
+    return resp.make_conditional(request)
 
 @app.route('/api/votacion/<int:votacion_id>/asistentes')
 @login_required
 @requires_role('votante')
 def asistentes_votacion(votacion_id):
     conn = get_conn()
-    perm = conn.execute('SELECT 1 FROM usuarios_votacion WHERE votacion_id=? AND user_id=? AND rol="votante"', (votacion_id, g.user['id'])).fetchone()
-    if not perm:
-        conn.close()
+    if not permisos.tiene(g.user['id'], votacion_id, 'votante'):
         return jsonify([]), 403
     rows = conn.execute(
         'SELECT id, accionista, representante, apoderado, acciones FROM asistencia WHERE votacion_id=? AND estado IN ("PRESENCIAL","VIRTUAL")',
         (votacion_id,)
     ).fetchall()
-    conn.close()
     return jsonify([dict(r) for r in rows])
 
 # --- Admin ---
 
+POR_PAGINA_ADMIN = 50
+MAX_POR_PAGINA_ADMIN = 200
+NOMBRES_POR_ROL = 10  # nombres de asistentes/votantes que se muestran por votación
+
+ORDEN_USUARIOS = {'username': 'u.username', 'cedula': 'u.cedula', 'role': 'u.role', 'id': 'u.id'}
+ORDEN_VOTACIONES = {'nombre': 'v.nombre', 'fecha': 'v.fecha', 'id': 'v.id',
+                    'quorum_minimo': 'v.quorum_minimo', 'preguntas': 'preguntas',
+                    'asistentes': 'asistentes', 'votantes': 'votantes'}
+
+def _pagina_admin(orden_permitido, orden_defecto):
+    """Lee ``pagina``, ``por_pagina``, ``orden`` y ``dir`` de la petición.
+
+    Devuelve ``(pagina, por_pagina, order_by)`` o lanza ``ValueError`` con el
+    mensaje para el cliente. Solo se aceptan columnas de la lista blanca.
+    """
+    pagina = request.args.get('pagina', 1, type=int)
+    por_pagina = request.args.get('por_pagina', POR_PAGINA_ADMIN, type=int)
+    if pagina < 1:
+        raise ValueError('pagina debe ser mayor que 0')
+    if not 0 < por_pagina <= MAX_POR_PAGINA_ADMIN:
+        raise ValueError(f'por_pagina debe estar entre 1 y {MAX_POR_PAGINA_ADMIN}')
+    orden = request.args.get('orden', orden_defecto)
+    if orden not in orden_permitido:
+        raise ValueError(f"orden debe ser uno de: {', '.join(orden_permitido)}")
+    direccion = 'DESC' if request.args.get('dir', 'asc').lower() == 'desc' else 'ASC'
+    # El id desempata para que las páginas no repitan ni salten filas
+    order_by = f'{orden_permitido[orden]} {direccion}, {orden_permitido["id"]} {direccion}'
+    return pagina, por_pagina, order_by
+
+@app.route('/api/admin/usuarios')
+@requires_role('admin')
+def api_admin_usuarios():
+    """Página de usuarios con las votaciones asignadas a cada uno.
+
+    ``q`` busca en nombre y cédula. Responde ``{total, pagina, por_pagina, filas}``.
+    """
+    try:
+        pagina, por_pagina, order_by = _pagina_admin(ORDEN_USUARIOS, 'username')
+    except ValueError as exc:
+        return jsonify({'error': str(exc)}), 400
+    where, params = '', []
+    q = request.args.get('q', '').strip()
+    if q:
+        where = "WHERE u.username LIKE ? ESCAPE '\\' OR u.cedula LIKE ? ESCAPE '\\'"
+        params = [_patron_like(q)] * 2
+    conn = get_conn()
+    total = conn.execute(f'SELECT COUNT(*) FROM users u {where}', params).fetchone()[0]
+    filas = [dict(r) for r in conn.execute(
+        f'SELECT u.id, u.username, u.cedula, u.role FROM users u {where} '
+        f'ORDER BY {order_by} LIMIT ? OFFSET ?',
+        params + [por_pagina, (pagina - 1) * por_pagina]
+    )]
+    if filas:
+        ids = [f['id'] for f in filas]
+        asignadas = {}
+        for r in conn.execute(
+            f"SELECT DISTINCT vu.user_id, v.id, v.nombre FROM usuarios_votacion vu "
+            f"JOIN votaciones v ON v.id = vu.votacion_id "
+            f"WHERE vu.user_id IN ({','.join('?' * len(ids))}) ORDER BY v.nombre",
+            ids
+        ):
+            asignadas.setdefault(r['user_id'], []).append({'id': r['id'], 'nombre': r['nombre']})
+        for f in filas:
+            f['votaciones'] = asignadas.get(f['id'], [])
+    return jsonify({'total': total, 'pagina': pagina, 'por_pagina': por_pagina, 'filas': filas})
+
+@app.route('/api/admin/votaciones')
+@requires_role('admin')
+def api_admin_votaciones():
+    """Página de votaciones con sus conteos de ``votaciones_resumen``.
+
+    Incluye hasta ``NOMBRES_POR_ROL`` nombres de asistentes y votantes por
+    votación; los conteos completos vienen en ``asistentes`` y ``votantes``.
+    """
+    try:
+        pagina, por_pagina, order_by = _pagina_admin(ORDEN_VOTACIONES, 'id')
+    except ValueError as exc:
+        return jsonify({'error': str(exc)}), 400
+    where, params = '', []
+    q = request.args.get('q', '').strip()
+    if q:
+        where = "WHERE v.nombre LIKE ? ESCAPE '\\'"
+        params = [_patron_like(q)]
+    conn = get_conn()
+    total = conn.execute(f'SELECT COUNT(*) FROM votaciones v {where}', params).fetchone()[0]
+    filas = [dict(r) for r in conn.execute(f'''
+        SELECT v.id, v.nombre, v.fecha, v.quorum_minimo,
+               COALESCE(r.preguntas, 0) AS preguntas,
+               COALESCE(r.asistentes, 0) AS asistentes,
+               COALESCE(r.votantes, 0) AS votantes
+        FROM votaciones v
+        LEFT JOIN votaciones_resumen r ON r.votacion_id = v.id
+        {where}
+        ORDER BY {order_by} LIMIT ? OFFSET ?
+    ''', params + [por_pagina, (pagina - 1) * por_pagina])]
+    if filas:
+        ids = [f['id'] for f in filas]
+        nombres = {}
+        for r in conn.execute(f'''
+            SELECT votacion_id, rol, username FROM (
+                SELECT vu.votacion_id, vu.rol, u.username,
+                       ROW_NUMBER() OVER (PARTITION BY vu.votacion_id, vu.rol ORDER BY u.username) AS n
+                FROM usuarios_votacion vu JOIN users u ON u.id = vu.user_id
+                WHERE vu.votacion_id IN ({','.join('?' * len(ids))})
+            ) WHERE n <= ?
+        ''', ids + [NOMBRES_POR_ROL]):
+            nombres.setdefault((r['votacion_id'], r['rol']), []).append(r['username'])
+        for f in filas:
+            f['asistentes_nombres'] = nombres.get((f['id'], 'asistencia'), [])
+            f['votantes_nombres'] = nombres.get((f['id'], 'votante'), [])
+    return jsonify({'total': total, 'pagina': pagina, 'por_pagina': por_pagina, 'filas': filas})
+
 @app.route('/admin/create_user', methods=['POST'])
 @requires_role('admin')
 def admin_create_user():
@@ -259,33 +1223,15 @@ def admin_create_user():
     cedula = request.form.get('cedula')
     conn = get_conn()
     try:
-        conn.execute(
+        cur = conn.execute(
             'INSERT INTO users (username, password, role, cedula) VALUES (?,?,?,?)',
             (username, generate_password_hash(password), role, cedula)
         )
         conn.commit()
+        # Descarta una entrada negativa previa (p. ej. una sesión anterior a recrear la base)
+        invalidar_cache('usuarios', cur.lastrowid)
     except sqlite3.IntegrityError:
-        users = conn.execute('''
-            SELECT u.id, u.username, u.cedula, u.role,
-                   COALESCE(GROUP_CONCAT(v.nombre, ', '), '') AS votaciones
-            FROM users u
-            LEFT JOIN usuarios_votacion vu ON vu.user_id = u.id
-            LEFT JOIN votaciones v ON v.id = vu.votacion_id
-            GROUP BY u.id
-        ''').fetchall()
-        votaciones = conn.execute('''
-            SELECT v.id, v.nombre, v.fecha,
-                   COUNT(DISTINCT p.id) AS num_preguntas,
-                   COUNT(DISTINCT CASE WHEN vu.rol = 'asistencia' THEN vu.user_id END) AS asistentes
-            FROM votaciones v
-            LEFT JOIN preguntas p ON p.votacion_id = v.id
-            LEFT JOIN usuarios_votacion vu ON vu.votacion_id = v.id
-            GROUP BY v.id
-        ''').fetchall()
-        conn.close()
-        return render_template('panel_admin.html', users=users, votaciones=votaciones,
-                               error='Usuario o cédula ya existe')
-    conn.close()
+        return render_template('panel_admin.html', error='Usuario o cédula ya existe')
     return redirect(url_for('panel_admin'))
 
 @app.route('/admin/delete_user/<int:user_id>', methods=['POST'])
@@ -293,10 +1239,11 @@ def admin_create_user():
 def admin_delete_user(user_id):
     """Elimina un usuario por ID."""
     conn = get_conn()
-    conn.execute('DELETE FROM users WHERE id = ?', (user_id,))
     conn.execute('DELETE FROM usuarios_votacion WHERE user_id = ?', (user_id,))
+    conn.execute('DELETE FROM users WHERE id = ?', (user_id,))
     conn.commit()
-    conn.close()
+    invalidar_cache('usuarios', user_id)
+    invalidar_cache('permisos', user_id)
     return redirect(url_for('panel_admin'))
 
 @app.route('/admin/create_votacion', methods=['POST'])
@@ -315,16 +1262,11 @@ def admin_create_votacion():
         cur = conn.cursor()
         cur.execute('INSERT INTO votaciones (nombre, fecha, quorum_minimo) VALUES (?,?,?)', (nombre, fecha, quorum))
         votacion_id = cur.lastrowid
-        for p in preguntas:
-            texto = p.get('texto', '').strip()
-            if not texto:
-                continue
-            cur.execute('INSERT INTO preguntas (votacion_id, texto) VALUES (?, ?)', (votacion_id, texto))
+        for p in _boleta_enviada(preguntas):
+            cur.execute('INSERT INTO preguntas (votacion_id, texto) VALUES (?, ?)', (votacion_id, p['texto']))
             pregunta_id = cur.lastrowid
-            for opt in p.get('opciones', []):
-                opt = opt.strip()
-                if opt:
-                    cur.execute('INSERT INTO opciones (pregunta_id, texto) VALUES (?, ?)', (pregunta_id, opt))
+            cur.executemany('INSERT INTO opciones (pregunta_id, texto) VALUES (?, ?)',
+                            [(pregunta_id, o['texto']) for o in p['opciones']])
         for uid in votantes:
             try:
                 cur.execute('INSERT INTO usuarios_votacion (votacion_id, user_id, rol) VALUES (?,?,?)', (votacion_id, uid, 'votante'))
@@ -336,7 +1278,9 @@ def admin_create_votacion():
             except sqlite3.IntegrityError:
                 pass
         conn.commit()
-        conn.close()
+        # La boleta pudo quedar en caché vacía si se consultó el id antes de existir
+        invalidar_cache('boletas', votacion_id)
+        invalidar_cache('permisos', votacion_id)
         return jsonify({'status': 'ok'})
     # Fallback para formularios antiguos
     nombre = request.form.get('nombre')
@@ -359,7 +1303,7 @@ def admin_create_votacion():
         for opt in [o.strip() for o in opciones.split(',') if o.strip()]:
             cur.execute('INSERT INTO opciones (pregunta_id, texto) VALUES (?, ?)', (pregunta_id, opt))
     conn.commit()
-    conn.close()
+    invalidar_cache('boletas', votacion_id)
     return redirect(url_for('panel_admin'))
 
 @app.route('/admin/votacion/<int:votacion_id>/delete', methods=['POST'])
@@ -372,7 +1316,9 @@ def admin_delete_votacion(votacion_id):
     cur.execute('DELETE FROM preguntas WHERE votacion_id=?', (votacion_id,))
     cur.execute('DELETE FROM votaciones WHERE id=?', (votacion_id,))
     conn.commit()
-    conn.close()
+    invalidar_cache('boletas', votacion_id)
+    invalidar_cache('permisos', votacion_id)
+    invalidar_cache('padron', votacion_id)
     return redirect(url_for('panel_admin'))
 
 @app.route('/admin/votacion/<int:votacion_id>/edit')
@@ -381,17 +1327,13 @@ def admin_edit_votacion(votacion_id):
     conn = get_conn()
     votacion = conn.execute('SELECT * FROM votaciones WHERE id=?', (votacion_id,)).fetchone()
     if not votacion:
-        conn.close()
         return redirect(url_for('panel_admin'))
-    preguntas = []
-    for p in conn.execute('SELECT * FROM preguntas WHERE votacion_id=?', (votacion_id,)).fetchall():
-        opts = conn.execute('SELECT texto FROM opciones WHERE pregunta_id=?', (p['id'],)).fetchall()
-        preguntas.append({'texto': p['texto'], 'opciones': [o['texto'] for o in opts]})
+    _, boleta = boletas.get(votacion_id, conn)
+    preguntas = [{'id': p['id'], 'texto': p['texto'], 'opciones': p['opciones']} for p in boleta]
     asignados = conn.execute('SELECT user_id, rol FROM usuarios_votacion WHERE votacion_id=?', (votacion_id,)).fetchall()
     votantes = [r['user_id'] for r in asignados if r['rol'] == 'votante']
     asistentes = [r['user_id'] for r in asignados if r['rol'] == 'asistencia']
     users = conn.execute('SELECT id, username, role FROM users').fetchall()
-    conn.close()
     data = {
         'id': votacion['id'],
         'nombre': votacion['nombre'],
@@ -403,45 +1345,134 @@ def admin_edit_votacion(votacion_id):
     }
     return render_template('edit_votacion.html', data=data, users=users)
 
+def _boleta_enviada(preguntas):
+    """Normaliza las preguntas del editor a ``[{id, texto, opciones: [{id, texto}]}]``.
+
+    Las opciones pueden llegar como texto (formularios anteriores) o como
+    ``{id, texto}``; ``id`` es ``None`` para lo que se crea nuevo.
+    """
+    boleta = []
+    for p in preguntas:
+        texto = str(p.get('texto') or '').strip()
+        if not texto:
+            continue
+        opciones = []
+        for opt in p.get('opciones', []):
+            if not isinstance(opt, dict):
+                opt = {'texto': opt}
+            opt_texto = str(opt.get('texto') or '').strip()
+            if opt_texto:
+                opciones.append({'id': int(opt['id']) if opt.get('id') else None, 'texto': opt_texto})
+        boleta.append({'id': int(p['id']) if p.get('id') else None, 'texto': texto, 'opciones': opciones})
+    return boleta
+
+def _emparejar(enviados, existentes):
+    """Asocia cada elemento enviado con uno guardado: por id y, si no lo trae, por texto.
+
+    ``existentes`` es ``{id: texto}``. Devuelve la lista de ids (``None`` si es
+    nuevo) y el conjunto de ids guardados que quedaron sin pareja.
+    """
+    libres = dict(existentes)
+    ids = []
+    for e in enviados:
+        if e['id'] in libres:
+            ids.append(e['id'])
+            del libres[e['id']]
+        else:
+            ids.append(None)
+    for i, e in enumerate(enviados):
+        if ids[i] is None:
+            id = next((k for k, t in libres.items() if t == e['texto']), None)
+            if id is not None:
+                ids[i] = id
+                del libres[id]
+    return ids, set(libres)
+
 @app.route('/admin/votacion/<int:votacion_id>/update', methods=['POST'])
 @requires_role('admin')
 def admin_update_votacion(votacion_id):
+    """Actualiza la votación aplicando solo las diferencias con lo guardado.
+
+    Preguntas y opciones conservan su id, de modo que los votos emitidos y las
+    cachés siguen siendo válidos; eliminar una opción con votos responde 409.
+    """
     data = request.get_json(silent=True) or {}
     nombre = data.get('nombre_votacion')
     fecha = data.get('fecha') or None
-    quorum = float(data.get('quorum_minimo') or 0)
-    preguntas = data.get('preguntas', [])
-    votantes = [int(u) for u in data.get('votantes', [])]
-    asistentes = [int(u) for u in data.get('asistentes', [])]
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute('UPDATE votaciones SET nombre=?, fecha=?, quorum_minimo=? WHERE id=?', (nombre, fecha, quorum, votacion_id))
-    cur.execute('DELETE FROM opciones WHERE pregunta_id IN (SELECT id FROM preguntas WHERE votacion_id=?)', (votacion_id,))
-    cur.execute('DELETE FROM preguntas WHERE votacion_id=?', (votacion_id,))
-    for p in preguntas:
-        texto = p.get('texto', '').strip()
-        if not texto:
-            continue
-        cur.execute('INSERT INTO preguntas (votacion_id, texto) VALUES (?, ?)', (votacion_id, texto))
-        pregunta_id = cur.lastrowid
-        for opt in p.get('opciones', []):
-            opt = opt.strip()
-            if opt:
-                cur.execute('INSERT INTO opciones (pregunta_id, texto) VALUES (?, ?)', (pregunta_id, opt))
-    cur.execute('DELETE FROM usuarios_votacion WHERE votacion_id=?', (votacion_id,))
-    for uid in votantes:
-        try:
-            cur.execute('INSERT INTO usuarios_votacion (votacion_id, user_id, rol) VALUES (?,?,?)', (votacion_id, uid, 'votante'))
-        except sqlite3.IntegrityError:
-            pass
-    for uid in asistentes:
-        try:
-            cur.execute('INSERT INTO usuarios_votacion (votacion_id, user_id, rol) VALUES (?,?,?)', (votacion_id, uid, 'asistencia'))
-        except sqlite3.IntegrityError:
-            pass
-    conn.commit()
-    conn.close()
-    return jsonify({'status': 'ok'})
+    try:
+        quorum = float(data.get('quorum_minimo') or 0)
+        boleta = _boleta_enviada(data.get('preguntas', []))
+        asignados = {(int(u), 'votante') for u in data.get('votantes', [])}
+        asignados |= {(int(u), 'asistencia') for u in data.get('asistentes', [])}
+    except (TypeError, ValueError, AttributeError):
+        return jsonify({'error': 'Datos inválidos'}), 400
+    try:
+        with writes.transaction(votacion_id) as conn:
+            conn.execute('UPDATE votaciones SET nombre=?, fecha=?, quorum_minimo=? WHERE id=?',
+                         (nombre, fecha, quorum, votacion_id))
+            preguntas_db = {r['id']: r['texto'] for r in conn.execute(
+                'SELECT id, texto FROM preguntas WHERE votacion_id=?', (votacion_id,))}
+            opciones_db = {}
+            for r in conn.execute(
+                'SELECT o.id, o.pregunta_id, o.texto FROM opciones o '
+                'JOIN preguntas p ON p.id = o.pregunta_id WHERE p.votacion_id=?', (votacion_id,)
+            ):
+                opciones_db.setdefault(r['pregunta_id'], {})[r['id']] = r['texto']
+
+            pregunta_ids, preguntas_borradas = _emparejar(boleta, preguntas_db)
+            opciones_borradas = {oid for pid in preguntas_borradas for oid in opciones_db.get(pid, {})}
+            preguntas_nuevas = 0
+            actualizar_preguntas, actualizar_opciones, opciones_nuevas = [], [], []
+            for p, pid in zip(boleta, pregunta_ids):
+                if pid is None:
+                    pid = conn.execute('INSERT INTO preguntas (votacion_id, texto) VALUES (?, ?)',
+                                       (votacion_id, p['texto'])).lastrowid
+                    preguntas_nuevas += 1
+                elif preguntas_db[pid] != p['texto']:
+                    actualizar_preguntas.append((p['texto'], pid))
+                guardadas = opciones_db.get(pid, {})
+                opcion_ids, sobrantes = _emparejar(p['opciones'], guardadas)
+                opciones_borradas |= sobrantes
+                for o, oid in zip(p['opciones'], opcion_ids):
+                    if oid is None:
+                        opciones_nuevas.append((pid, o['texto']))
+                    elif guardadas[oid] != o['texto']:
+                        actualizar_opciones.append((o['texto'], oid))
+
+            if opciones_borradas:
+                marcas = ','.join('?' * len(opciones_borradas))
+                con_votos = conn.execute(
+                    f'SELECT COUNT(*) FROM votos_totales WHERE votos > 0 AND opcion_id IN ({marcas})',
+                    tuple(opciones_borradas)
+                ).fetchone()[0]
+                if con_votos:
+                    # Deshace también lo ya insertado en esta transacción
+                    raise ValueError(f'No se pueden eliminar opciones con votos registrados ({con_votos})')
+            conn.executemany('UPDATE preguntas SET texto=? WHERE id=?', actualizar_preguntas)
+            conn.executemany('UPDATE opciones SET texto=? WHERE id=?', actualizar_opciones)
+            conn.executemany('INSERT INTO opciones (pregunta_id, texto) VALUES (?, ?)', opciones_nuevas)
+            conn.executemany('DELETE FROM opciones WHERE id=?', [(oid,) for oid in opciones_borradas])
+            conn.executemany('DELETE FROM preguntas WHERE id=?', [(pid,) for pid in preguntas_borradas])
+
+            actuales = {(r['user_id'], r['rol']) for r in conn.execute(
+                'SELECT user_id, rol FROM usuarios_votacion WHERE votacion_id=?', (votacion_id,))}
+            retirar, asignar = actuales - asignados, asignados - actuales
+            conn.executemany('DELETE FROM usuarios_votacion WHERE votacion_id=? AND user_id=? AND rol=?',
+                             [(votacion_id, uid, rol) for uid, rol in retirar])
+            conn.executemany('INSERT OR IGNORE INTO usuarios_votacion (votacion_id, user_id, rol) VALUES (?,?,?)',
+                             [(votacion_id, uid, rol) for uid, rol in asignar])
+    except ValueError as exc:
+        return jsonify({'error': str(exc)}), 409
+    invalidar_cache('boletas', votacion_id)
+    invalidar_cache('permisos', votacion_id)
+    return jsonify({'status': 'ok', 'cambios': {
+        'preguntas': {'insertadas': preguntas_nuevas, 'actualizadas': len(actualizar_preguntas),
+                      'eliminadas': len(preguntas_borradas)},
+        'opciones': {'insertadas': len(opciones_nuevas), 'actualizadas': len(actualizar_opciones),
+                     'eliminadas': len(opciones_borradas)},
+        'usuarios': {'asignados': len(asignar), 'retirados': len(retirar)},
+    }})
+
 @app.route('/admin/asignar', methods=['POST'])
 @requires_role('admin')
 def admin_asignar():
@@ -452,11 +1483,336 @@ def admin_asignar():
     conn.execute('INSERT INTO usuarios_votacion (votacion_id, user_id, rol) VALUES (?,?,?)',
                  (votacion_id, user_id, rol))
     conn.commit()
-    conn.close()
+    invalidar_cache('permisos', votacion_id)
     return redirect(url_for('panel_admin'))
 
+USUARIOS_COLUMNAS = {
+    'USUARIO': 'USUARIO',
+    'CEDULA': 'CEDULA',
+    'ROL': 'ROL',
+    'CONTRASENA': 'CONTRASEÑA',
+}
+USUARIOS_LOTE = 500
+ROLES = ('admin', 'asistencia', 'votante')
+
+def _columnas_usuarios(header):
+    """Índice de cada columna canónica en el encabezado; ``ValueError`` si faltan."""
+    indices = {_norm_col(str(c)): i for i, c in enumerate(header) if c is not None}
+    missing = [orig for key, orig in USUARIOS_COLUMNAS.items() if key not in indices]
+    if missing:
+        raise ValueError(f"Columnas faltantes o mal escritas: {', '.join(missing)}")
+    return {orig: indices[key] for key, orig in USUARIOS_COLUMNAS.items()} | {
+        'VOTACIONES': indices.get('VOTACIONES')}
+
+def _bloques_csv(path, tamano):
+    """Igual que ``_bloques_excel`` para un CSV separado por comas o punto y coma."""
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        muestra = f.read(4096)
+        f.seek(0)
+        try:
+            dialecto = csv.Sniffer().sniff(muestra, delimiters=',;')
+        except csv.Error:
+            dialecto = csv.excel
+        yield from _bloques(csv.reader(f, dialecto), tamano)
+
+def _celda_texto(valor):
+    if valor is None:
+        return ''
+    if isinstance(valor, float) and valor.is_integer():
+        valor = int(valor)  # cédulas leídas como número desde Excel
+    return str(valor).strip()
+
+def _usuarios_archivo(path, ext, votaciones):
+    """Lee y valida el archivo de usuarios.
+
+    ``votaciones`` asocia id (texto) y nombre de cada votación con su id.
+    Devuelve ``(validos, reporte)``: los usuarios a crear, con su número de
+    fila, y una entrada de reporte por fila en el orden del archivo.
+    """
+    bloques = _bloques_csv(path, USUARIOS_LOTE) if ext == 'csv' else _bloques_excel(path, USUARIOS_LOTE)
+    columnas = None
+    validos, reporte = [], []
+    vistos_usuario, vistos_cedula = set(), set()
+    for fila_inicial, header, bloque in bloques:
+        if columnas is None:
+            columnas = _columnas_usuarios(header)
+        for fila, row in enumerate(bloque, fila_inicial):
+            def valor(col):
+                i = columnas[col]
+                return _celda_texto(row[i]) if i is not None and i < len(row) else ''
+            username, cedula = valor('USUARIO'), valor('CEDULA') or None
+            rol, password = valor('ROL').lower(), valor('CONTRASEÑA')
+            if not any((username, cedula, rol, password, valor('VOTACIONES'))):
+                continue  # fila vacía
+            entrada = {'fila': fila, 'username': username, 'estado': 'error'}
+            reporte.append(entrada)
+            nombres = [v.strip() for v in valor('VOTACIONES').replace(';', ',').split(',') if v.strip()]
+            asignadas = {votaciones.get(v) for v in nombres}
+            if not username or not password:
+                entrada['error'] = 'Falta USUARIO o CONTRASEÑA'
+            elif rol not in ROLES:
+                entrada['error'] = f"ROL debe ser uno de: {', '.join(ROLES)}"
+            elif None in asignadas:
+                entrada['error'] = 'Votación no encontrada: ' + ', '.join(
+                    v for v in nombres if v not in votaciones)
+            elif asignadas and rol == 'admin':
+                entrada['error'] = 'Los administradores no se asignan a votaciones'
+            elif username in vistos_usuario or (cedula and cedula in vistos_cedula):
+                entrada['error'] = 'Usuario o cédula repetido en el archivo'
+            else:
+                vistos_usuario.add(username)
+                if cedula:
+                    vistos_cedula.add(cedula)
+                validos.append({'entrada': entrada, 'username': username, 'cedula': cedula,
+                                'rol': rol, 'password': password, 'votaciones': sorted(asignadas)})
+    if columnas is None:
+        raise ValueError('Archivo vacío')
+    return validos, reporte
+
+def _existentes(conn, usuarios):
+    """Nombres y cédulas de ``usuarios`` que ya están en la base."""
+    nombres, cedulas = set(), set()
+    for i in range(0, len(usuarios), USUARIOS_LOTE):
+        lote = usuarios[i:i + USUARIOS_LOTE]
+        us = [u['username'] for u in lote]
+        ced = [u['cedula'] for u in lote if u['cedula']]
+        for r in conn.execute(
+            f"SELECT username, cedula FROM users WHERE username IN ({','.join('?' * len(us))}) "
+            f"OR cedula IN ({','.join('?' * len(ced))})", us + ced
+        ):
+            nombres.add(r['username'])
+            cedulas.add(r['cedula'])
+    return nombres, cedulas
+
+def _descartar_existentes(conn, usuarios):
+    nombres, cedulas = _existentes(conn, usuarios)
+    nuevos = []
+    for u in usuarios:
+        if u['username'] in nombres or (u['cedula'] and u['cedula'] in cedulas):
+            u['entrada']['error'] = 'Usuario o cédula ya existe'
+        else:
+            nuevos.append(u)
+    return nuevos
+
+def _importar_usuarios(job_id, path, ext):
+    """Crea los usuarios del archivo y sus asignaciones a votaciones.
+
+    Los hashes se calculan en ``hashes`` (varios procesos) mientras los lotes
+    ya listos se insertan, cada uno en su propia transacción.
+    """
+    inicio = time.perf_counter()
+    creados = asignaciones = 0
+    reporte = []
+    try:
+        with pool.connection() as conn:
+            votaciones = {}
+            for r in conn.execute('SELECT id, nombre FROM votaciones'):
+                votaciones[str(r['id'])] = votaciones[r['nombre']] = r['id']
+            validos, reporte = _usuarios_archivo(path, ext, votaciones)
+            validos = _descartar_existentes(conn, validos)
+            # El reporte se publica al terminar: hasta entonces sus filas se
+            # modifican sin el lock y upload_job podría serializarlas a medias
+            _actualizar_job(job_id, total=len(reporte))
+            lote = []
+            ultimo = validos[-1] if validos else None
+            for u, hash_ in zip(validos, hashes.generar(u['password'] for u in validos)):
+                u['hash'] = hash_
+                lote.append(u)
+                if len(lote) < USUARIOS_LOTE and u is not ultimo:
+                    continue
+                with writes.transaction(None, conn):
+                    # Con BEGIN IMMEDIATE nadie más escribe: la comprobación vale para el INSERT
+                    lote = _descartar_existentes(conn, lote)
+                    conn.executemany('INSERT INTO users (username, password, role, cedula) VALUES (?,?,?,?)',
+                                     [(u['username'], u['hash'], u['rol'], u['cedula']) for u in lote])
+                    ids = {}
+                    for i in range(0, len(lote), USUARIOS_LOTE):
+                        us = [u['username'] for u in lote[i:i + USUARIOS_LOTE]]
+                        ids.update(conn.execute(
+                            f"SELECT username, id FROM users WHERE username IN ({','.join('?' * len(us))})", us
+                        ).fetchall())
+                    filas = [(vid, ids[u['username']], u['rol']) for u in lote for vid in u['votaciones']]
+                    conn.executemany('INSERT OR IGNORE INTO usuarios_votacion (votacion_id, user_id, rol) '
+                                     'VALUES (?,?,?)', filas)
+                for u in lote:
+                    u['entrada'].update(estado='creado', id=ids[u['username']])
+                creados += len(lote)
+                asignaciones += len(filas)
+                lote = []
+                _actualizar_job(job_id, creados=creados)
+        # Borra entradas negativas de la caché (ids reutilizados tras borrar usuarios)
+        invalidar_cache('usuarios', None)
+        if asignaciones:
+            invalidar_cache('permisos', None)
+        segundos = time.perf_counter() - inicio
+        _actualizar_job(job_id, estado='completado', creados=creados, asignaciones=asignaciones,
+                        reporte=reporte,
+                        total_errores=sum(1 for e in reporte if e['estado'] == 'error'),
+                        segundos=round(segundos, 3),
+                        usuarios_por_segundo=round(creados / segundos) if segundos else creados)
+    except Exception as e:
+        _actualizar_job(job_id, estado='error', error=str(e), creados=creados, reporte=reporte)
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+@app.route('/admin/usuarios/importar', methods=['POST'])
+@requires_role('admin')
+def admin_importar_usuarios():
+    """Importa usuarios desde un .xlsx o .csv en segundo plano.
+
+    Columnas: USUARIO, CEDULA, ROL, CONTRASEÑA y, opcionalmente, VOTACIONES
+    (ids o nombres separados por comas; se asignan con el rol del usuario).
+    El avance se consulta en ``/upload/jobs/<job_id>``, que incluye el reporte
+    por fila cuando la importación termina.
+    """
+    f = request.files.get('file')
+    if not f:
+        return jsonify({'error': 'Datos incompletos'}), 400
+    ext = secure_filename(f.filename).rsplit('.', 1)[-1].lower()
+    if ext not in ('xlsx', 'csv'):
+        return jsonify({'error': 'Formato no permitido'}), 400
+    job_id, path = _nuevo_job(f, ext, tipo='usuarios', votacion_id=None, total=0, creados=0, reporte=[])
+    socketio.start_background_task(_importar_usuarios, job_id, path, ext)
+    return jsonify({'job_id': job_id}), 202
+
 # --- Asistencia existente ---
 
+ASISTENCIA_COLUMNAS = {
+    'ACCIONISTA': 'ACCIONISTA',
+    'REPRESENTANTELEGAL': 'REPRESENTANTE LEGAL',
+    'APODERADO': 'APODERADO',
+    'NOACCIONES': 'No. ACCIONES',
+}
+MAX_ERRORES_REPORTE = 200
+INSERT_ASISTENCIA = ('INSERT INTO asistencia (votacion_id, accionista, representante, apoderado, acciones, estado) '
+                     'VALUES (?,?,?,?,?,?)')
+
+_fts_asistencia = None
+
+def tiene_fts_asistencia(conn):
+    """Indica si existe el índice FTS5 de nombres (migración 5)."""
+    global _fts_asistencia
+    if _fts_asistencia is None:
+        _fts_asistencia = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type='table' AND name='asistencia_fts'"
+        ).fetchone() is not None
+    return _fts_asistencia
+
+class AsistenciaConVotos(Exception):
+    """La votación ya tiene votos; reimportar cambiaría los ids de asistencia que los identifican."""
+
+    def __init__(self):
+        super().__init__('La votación ya tiene votos registrados; no se puede reimportar la asistencia')
+
+
+def votacion_con_votos(conn, votacion_id):
+    return conn.execute('SELECT 1 FROM votos WHERE votacion_id=? LIMIT 1', (votacion_id,)).fetchone() is not None
+
+def reemplazar_asistencia(conn, votacion_id, insertar):
+    """Sustituye la asistencia de una votación dentro de la transacción en curso.
+
+    ``insertar(conn)`` inserta las filas nuevas. El índice FTS se actualiza
+    en bloque: primero se retiran los nombres anteriores y después se indexan
+    los nuevos con una sola sentencia cada vez. Lanza ``AsistenciaConVotos``
+    si la votación ya tiene votos: quedarían ligados a ids que dejan de existir
+    y el control de voto duplicado se perdería.
+    """
+    if votacion_con_votos(conn, votacion_id):
+        raise AsistenciaConVotos()
+    fts = tiene_fts_asistencia(conn)
+    if fts:
+        conn.execute(
+            """INSERT INTO asistencia_fts (asistencia_fts, rowid, accionista, representante, apoderado)
+               SELECT 'delete', id, accionista, representante, apoderado FROM asistencia WHERE votacion_id=?""",
+            (votacion_id,)
+        )
+    conn.execute('DELETE FROM asistencia WHERE votacion_id=?', (votacion_id,))
+    insertar(conn)
+    if fts:
+        conn.execute(
+            """INSERT INTO asistencia_fts (rowid, accionista, representante, apoderado)
+               SELECT id, accionista, representante, apoderado FROM asistencia WHERE votacion_id=?""",
+            (votacion_id,)
+        )
+    version = version_asistencia(conn, votacion_id)[0] + 1
+    registrar_version(conn, votacion_id, version, reinicio=True)
+    return version
+
+def _norm_col(s: str) -> str:
+    return ''.join(ch for ch in unicodedata.normalize('NFD', s) if ch.isalnum()).upper()
+
+
+def _columnas_asistencia(columns):
+    """Mapa de encabezados del Excel a nombres canónicos; ``ValueError`` si faltan."""
+    cols_map = {_norm_col(str(c)): c for c in columns if c is not None}
+    missing = [orig for key, orig in ASISTENCIA_COLUMNAS.items() if key not in cols_map]
+    if missing:
+        raise ValueError(f"Columnas faltantes o mal escritas: {', '.join(missing)}")
+    rename_map = {cols_map[key]: orig for key, orig in ASISTENCIA_COLUMNAS.items()}
+    if 'ASISTENCIA' in cols_map:
+        rename_map[cols_map['ASISTENCIA']] = 'ASISTENCIA'
+    return rename_map
+
+
+def _filas_asistencia(df, votacion_id, fila_inicial=2):
+    """Construye por columnas las tuplas a insertar y los errores por fila.
+
+    ``df`` ya tiene los encabezados canónicos; ``fila_inicial`` es el número de
+    fila del Excel que corresponde a la primera fila del DataFrame.
+    """
+    import numpy as np
+    import pandas as pd
+    n = len(df)
+    numeros = np.arange(fila_inicial, fila_inicial + n)
+
+    def texto(col):
+        s = df[col].astype(object)
+        return s.where(s.notna(), None)
+
+    accionista = texto('ACCIONISTA')
+    representante = texto('REPRESENTANTE LEGAL')
+    apoderado = texto('APODERADO')
+
+    raw_acciones = df['No. ACCIONES']
+    acciones = pd.to_numeric(raw_acciones, errors='coerce')
+    acciones_invalidas = (raw_acciones.notna() & acciones.isna()).to_numpy()
+    acciones = acciones.fillna(0).astype(int)
+
+    if 'ASISTENCIA' in df.columns:
+        raw_estado = df['ASISTENCIA']
+        estado = raw_estado.astype(object).where(raw_estado.notna(), '').astype(str).str.strip().str.upper()
+        estado_invalido = ((estado != '') & ~estado.isin(ALLOWED_ESTADOS)).to_numpy()
+        estado = estado.where(estado.isin(ALLOWED_ESTADOS), 'AUSENTE')
+    else:
+        estado = pd.Series('AUSENTE', index=df.index)
+        estado_invalido = np.zeros(n, dtype=bool)
+
+    vacias = (accionista.isna() & representante.isna() & apoderado.isna()).to_numpy()
+    validas = ~vacias
+
+    errores = []
+    for fila in numeros[vacias]:
+        errores.append({'fila': int(fila), 'error': 'Fila sin accionista, representante ni apoderado (omitida)'})
+    for fila in numeros[acciones_invalidas & validas]:
+        errores.append({'fila': int(fila), 'error': 'No. ACCIONES no numérico (se usa 0)'})
+    for fila in numeros[estado_invalido & validas]:
+        errores.append({'fila': int(fila), 'error': 'ASISTENCIA no reconocida (se usa AUSENTE)'})
+    errores.sort(key=lambda e: e['fila'])
+
+    filas = list(zip(
+        [votacion_id] * int(validas.sum()),
+        accionista[validas].tolist(),
+        representante[validas].tolist(),
+        apoderado[validas].tolist(),
+        acciones[validas].tolist(),
+        estado[validas].tolist(),
+    ))
+    return filas, errores
+
+
 @app.route('/upload', methods=['POST'])
 @requires_role('asistencia', 'admin')
 def upload():
@@ -471,72 +1827,286 @@ def upload():
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
     path = os.path.join(app.config['UPLOAD_FOLDER'], name)
     f.save(path)
+    import pandas as pd
     try:
+        inicio = time.perf_counter()
         df = pd.read_excel(path, engine='openpyxl')
+        try:
+            df = df.rename(columns=_columnas_asistencia(df.columns))
+        except ValueError as exc:
+            return jsonify({'error': str(exc)}), 400
+        filas, errores = _filas_asistencia(df, votacion_id)
+        inicio_insercion = time.perf_counter()
+        with writes.transaction(votacion_id) as conn:
+            version = reemplazar_asistencia(conn, votacion_id, lambda c: c.executemany(INSERT_ASISTENCIA, filas))
+        invalidar_cache('padron', votacion_id)
+        socketio.emit('asistencia_recargada', {'votacion_id': votacion_id, 'version': version}, to=sala(votacion_id))
+        fin = time.perf_counter()
+        segundos = fin - inicio
+        return jsonify({
+            'ok': True,
+            'filas': len(filas),
+            'segundos': round(segundos, 3),
+            'segundos_insercion': round(fin - inicio_insercion, 3),
+            'filas_por_segundo': round(len(filas) / segundos) if segundos else len(filas),
+            'errores': errores[:MAX_ERRORES_REPORTE],
+            'total_errores': len(errores),
+        })
+    except AsistenciaConVotos as e:
+        return jsonify({'error': str(e)}), 409
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
 
-        def norm(s: str) -> str:
-            return ''.join(ch for ch in unicodedata.normalize('NFD', s) if ch.isalnum()).upper()
-
-        cols_map = {norm(c): c for c in df.columns}
-        required = {
-            'ACCIONISTA': 'ACCIONISTA',
-            'REPRESENTANTELEGAL': 'REPRESENTANTE LEGAL',
-            'APODERADO': 'APODERADO',
-            'NOACCIONES': 'No. ACCIONES',
-        }
-        missing = [orig for key, orig in required.items() if key not in cols_map]
-        if missing:
-            return jsonify({'error': f"Columnas faltantes o mal escritas: {', '.join(missing)}"}), 400
-
-        rename_map = {cols_map[key]: orig for key, orig in required.items()}
-        df = df.rename(columns=rename_map)
-
-        asis_col = cols_map.get('ASISTENCIA')
-        if not asis_col:
-            df['ASISTENCIA'] = 'AUSENTE'
-        else:
-            df['ASISTENCIA'] = df[asis_col].astype(str).str.strip().str.upper()
-        df['ASISTENCIA'] = df['ASISTENCIA'].where(df['ASISTENCIA'].isin(ALLOWED_ESTADOS), 'AUSENTE')
+IMPORT_BLOQUE = 2000
+MAX_IMPORT_JOBS = 50
+import_jobs = OrderedDict()
+import_jobs_lock = threading.Lock()
+
+
+def _nuevo_job(archivo, ext, **campos):
+    """Guarda el archivo subido y registra su importación en ``import_jobs``.
+
+    Devuelve ``(job_id, ruta)``; se descartan los trabajos más antiguos por
+    encima de ``MAX_IMPORT_JOBS``.
+    """
+    job_id = uuid.uuid4().hex
+    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    path = os.path.join(app.config['UPLOAD_FOLDER'], f'{job_id}.{ext}')
+    archivo.save(path)
+    with import_jobs_lock:
+        import_jobs[job_id] = {'job_id': job_id, 'estado': 'en_curso', **campos}
+        while len(import_jobs) > MAX_IMPORT_JOBS:
+            import_jobs.popitem(last=False)
+    return job_id, path
 
-        df['No. ACCIONES'] = pd.to_numeric(df.get('No. ACCIONES', 0), errors='coerce').fillna(0).astype(int)
-        with db_lock:
-            conn = get_conn()
+
+def _bloques(rows, tamano):
+    """Parte ``rows`` (encabezado incluido) en tuplas ``(fila_inicial, encabezado, filas)``."""
+    header = next(rows, None)
+    if header is None:
+        raise ValueError('Archivo vacío')
+    fila_inicial = 2
+    bloque = []
+    for row in rows:
+        bloque.append(row)
+        if len(bloque) >= tamano:
+            yield fila_inicial, header, bloque
+            fila_inicial += len(bloque)
+            bloque = []
+    if bloque:
+        yield fila_inicial, header, bloque
+
+
+def _bloques_excel(path, tamano):
+    """Recorre la primera hoja en modo solo lectura y entrega bloques de filas.
+
+    Produce tuplas ``(fila_inicial, encabezado, filas)`` sin cargar el libro
+    completo en memoria.
+    """
+    from openpyxl import load_workbook
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        yield from _bloques(wb.active.iter_rows(values_only=True), tamano)
+    finally:
+        wb.close()
+
+
+def _actualizar_job(job_id, **campos):
+    with import_jobs_lock:
+        job = import_jobs.get(job_id)
+        if job is None:
+            return
+        job.update(campos)
+        evento = {k: v for k, v in job.items() if k not in ('errores', 'reporte')}
+    if evento['votacion_id']:
+        socketio.emit('importacion_progreso', evento, to=sala(evento['votacion_id']))
+
+
+def _importar_en_segundo_plano(job_id, path, votacion_id):
+    """Importa el Excel por bloques en una tabla temporal y la publica al final.
+
+    Cada bloque se valida y se inserta en ``temp.asistencia_import`` (propia de
+    la conexión, no bloquea la base); la sustitución de la asistencia de la
+    votación es una única transacción corta, de modo que los lectores nunca ven
+    una importación a medias.
+    """
+    import pandas as pd
+    inicio = time.perf_counter()
+    filas_total = 0
+    errores = []
+    total_errores = 0
+    try:
+        with pool.connection() as conn:
+            conn.execute('''CREATE TEMP TABLE IF NOT EXISTS asistencia_import (
+                votacion_id INTEGER, accionista TEXT, representante TEXT,
+                apoderado TEXT, acciones INTEGER, estado TEXT)''')
+            conn.execute('DELETE FROM temp.asistencia_import')
+            conn.commit()
             try:
-                conn.execute('DELETE FROM asistencia WHERE votacion_id=?', (votacion_id,))
-                for _, r in df.iterrows():
-                    conn.execute(
-                        'INSERT INTO asistencia (votacion_id, accionista,representante,apoderado,acciones,estado) VALUES (?,?,?,?,?,?)',
-                        (
-                            votacion_id,
-                            r.get('ACCIONISTA'),
-                            r.get('REPRESENTANTE LEGAL'),
-                            r.get('APODERADO'),
-                            int(r['No. ACCIONES']),
-                            r['ASISTENCIA']
-                        )
-                    )
-                conn.commit()
+                rename_map = None
+                for fila_inicial, header, bloque in _bloques_excel(path, IMPORT_BLOQUE):
+                    if rename_map is None:
+                        rename_map = _columnas_asistencia(header)
+                    df = pd.DataFrame(bloque, columns=header).rename(columns=rename_map)
+                    filas, errs = _filas_asistencia(df, votacion_id, fila_inicial)
+                    conn.executemany('INSERT INTO temp.asistencia_import VALUES (?,?,?,?,?,?)', filas)
+                    conn.commit()
+                    filas_total += len(filas)
+                    total_errores += len(errs)
+                    errores.extend(errs[:MAX_ERRORES_REPORTE - len(errores)])
+                    _actualizar_job(job_id, filas=filas_total, total_errores=total_errores, errores=list(errores))
+                with writes.transaction(votacion_id, conn):
+                    version = reemplazar_asistencia(conn, votacion_id, lambda c: c.execute(
+                        '''INSERT INTO asistencia (votacion_id, accionista, representante, apoderado, acciones, estado)
+                           SELECT votacion_id, accionista, representante, apoderado, acciones, estado
+                           FROM temp.asistencia_import ORDER BY rowid'''
+                    ))
             finally:
-                conn.close()
-        return jsonify({'ok': True})
+                conn.execute('DROP TABLE IF EXISTS temp.asistencia_import')
+                conn.commit()
+        invalidar_cache('padron', votacion_id)
+        socketio.emit('asistencia_recargada', {'votacion_id': votacion_id, 'version': version}, to=sala(votacion_id))
+        segundos = time.perf_counter() - inicio
+        _actualizar_job(job_id, estado='completado', segundos=round(segundos, 3),
+                        filas_por_segundo=round(filas_total / segundos) if segundos else filas_total)
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        _actualizar_job(job_id, estado='error', error=str(e))
     finally:
         try:
             os.remove(path)
         except OSError:
             pass
 
+
+@app.route('/upload/stream', methods=['POST'])
+@requires_role('asistencia', 'admin')
+def upload_stream():
+    """Inicia una importación en segundo plano y devuelve su identificador."""
+    f = request.files.get('file')
+    votacion_id = request.form.get('votacion_id', type=int)
+    if not f or not votacion_id:
+        return jsonify({'error': 'Datos incompletos'}), 400
+    ext = secure_filename(f.filename).rsplit('.', 1)[-1].lower()
+    if ext != 'xlsx':
+        return jsonify({'error': 'Formato no permitido'}), 400
+    # Aviso inmediato; reemplazar_asistencia lo vuelve a comprobar al publicar
+    if votacion_con_votos(get_conn(), votacion_id):
+        return jsonify({'error': str(AsistenciaConVotos())}), 409
+    job_id, path = _nuevo_job(f, ext, votacion_id=votacion_id, filas=0, total_errores=0, errores=[])
+    socketio.start_background_task(_importar_en_segundo_plano, job_id, path, votacion_id)
+    return jsonify({'job_id': job_id}), 202
+
+
+@app.route('/upload/jobs/<job_id>')
+@requires_role('asistencia', 'admin')
+def upload_job(job_id):
+    with import_jobs_lock:
+        job = import_jobs.get(job_id)
+        job = dict(job) if job else None
+    if not job or (job.get('tipo') == 'usuarios' and g.user['role'] != 'admin'):
+        return jsonify({'error': 'Importación no encontrada'}), 404
+    return jsonify(job)
+
+PAGINA_ASISTENCIA = 200
+MAX_PAGINA_ASISTENCIA = 1000
+
+def _consulta_fts(q):
+    """Convierte el texto buscado en una consulta FTS5: todas las palabras, por prefijo."""
+    palabras = [p.replace('"', '') for p in q.split()]
+    return ' '.join(f'"{p}"*' for p in palabras if any(ch.isalnum() for ch in p))
+
+def _patron_like(q):
+    """Patrón ``%q%`` para ``LIKE ... ESCAPE '\\'`` con los comodines escapados."""
+    return '%' + q.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+
+def _filtro_texto(conn, q):
+    if tiene_fts_asistencia(conn):
+        consulta = _consulta_fts(q)
+        if consulta:
+            return 'id IN (SELECT rowid FROM asistencia_fts WHERE asistencia_fts MATCH ?)', [consulta]
+    patron = _patron_like(q)
+    return ("(accionista LIKE ? ESCAPE '\\' OR representante LIKE ? ESCAPE '\\' "
+            "OR apoderado LIKE ? ESCAPE '\\')"), [patron] * 3
+
+def _filtro_asistencia(conn, votacion_id, estado='', q=''):
+    """Condiciones y parámetros del filtro de la tabla de asistencia (estado y búsqueda)."""
+    condiciones, params = ['votacion_id = ?'], [votacion_id]
+    if estado:
+        condiciones.append('estado = ?')
+        params.append(estado)
+    if q:
+        filtro, valores = _filtro_texto(conn, q)
+        condiciones.append(filtro)
+        params.extend(valores)
+    return condiciones, params
+
 @app.route('/api/asistencia')
 @requires_role('asistencia', 'admin', 'votante')
 def get_asistencia():
+    """Lista la asistencia de una votación.
+
+    - Sin parámetros adicionales: todas las filas (lista).
+    - ``since``: sincronización incremental (ver ``version_asistencia``).
+    - ``estado``, ``q``, ``limit`` o ``cursor``: una página ordenada por id;
+      ``siguiente`` es el cursor de la página siguiente (``null`` al final).
+    """
     votacion_id = request.args.get('votacion_id', type=int)
     if not votacion_id:
         return jsonify([])
     conn = get_conn()
-    rows = conn.execute('SELECT * FROM asistencia WHERE votacion_id=?', (votacion_id,)).fetchall()
-    conn.close()
-    return jsonify([dict(r) for r in rows])
+    limit = request.args.get('limit', type=int)
+    if limit is not None and not 0 < limit <= MAX_PAGINA_ASISTENCIA:
+        return jsonify({'error': f'limit debe estar entre 1 y {MAX_PAGINA_ASISTENCIA}'}), 400
+    since = request.args.get('since', type=int)
+    if since is not None:
+        # Sincronización incremental: solo las filas cambiadas después de `since`,
+        # o todas si el cliente es anterior a la última recarga completa
+        version, reinicio = version_asistencia(conn, votacion_id)
+        completa = since < reinicio or since > version or since <= 0
+        if completa and limit:
+            # Un cliente paginado vuelve a pedir su página en vez de descargar todo
+            return jsonify({'version': version, 'reinicio': True, 'filas': []})
+        if completa:
+            rows = conn.execute('SELECT * FROM asistencia WHERE votacion_id=?', (votacion_id,)).fetchall()
+        else:
+            sql = 'SELECT * FROM asistencia WHERE votacion_id=? AND version > ?'
+            params = [votacion_id, since]
+            if limit:
+                sql += ' LIMIT ?'
+                params.append(limit + 1)
+            rows = conn.execute(sql, params).fetchall()
+            if limit and len(rows) > limit:
+                return jsonify({'version': version, 'reinicio': True, 'filas': []})
+        return jsonify({'version': version, 'reinicio': completa, 'filas': [dict(r) for r in rows]})
+
+    args = request.args
+    if not any(k in args for k in ('estado', 'q', 'limit', 'cursor')):
+        rows = conn.execute('SELECT * FROM asistencia WHERE votacion_id=?', (votacion_id,)).fetchall()
+        return jsonify([dict(r) for r in rows])
+
+    estado = args.get('estado', '').upper()
+    if estado and estado not in ALLOWED_ESTADOS:
+        return jsonify({'error': 'Estado inválido'}), 400
+    condiciones, params = _filtro_asistencia(conn, votacion_id, estado, args.get('q', '').strip())
+    cursor = args.get('cursor', type=int)
+    if cursor:
+        condiciones.append('id > ?')
+        params.append(cursor)
+    limit = limit or PAGINA_ASISTENCIA
+    # La versión se lee antes que la página: los eventos posteriores a ella
+    # se aplican sobre las filas mostradas
+    version = version_asistencia(conn, votacion_id)[0]
+    rows = conn.execute(
+        f'SELECT * FROM asistencia WHERE {" AND ".join(condiciones)} ORDER BY id LIMIT ?',
+        params + [limit + 1]
+    ).fetchall()
+    siguiente = rows[limit - 1]['id'] if len(rows) > limit else None
+    return jsonify({'version': version, 'filas': [dict(r) for r in rows[:limit]], 'siguiente': siguiente})
 
 
 @app.route('/api/asistencia/resumen')
@@ -545,10 +2115,12 @@ def asistencia_resumen():
     votacion_id = request.args.get('votacion_id', type=int)
     if not votacion_id:
         return jsonify({'error': 'votacion_id requerido'}), 400
-    total, activos, data = resumen_acciones(votacion_id)
     conn = get_conn()
+    total, activos, data = resumen_acciones(votacion_id, conn)
+    registros = dict(conn.execute(
+        'SELECT estado, registros FROM asistencia_resumen WHERE votacion_id=?', (votacion_id,)
+    ).fetchall())
     row = conn.execute('SELECT quorum_minimo FROM votaciones WHERE id=?', (votacion_id,)).fetchone()
-    conn.close()
     quorum_minimo = row['quorum_minimo'] if row else 0
     quorum_porcentaje = (activos / total * 100) if total else 0
     result = {
@@ -559,6 +2131,7 @@ def asistencia_resumen():
         'quorum_cumplido': quorum_porcentaje >= quorum_minimo,
         'por_estado': {
             e: {
+                'registros': registros.get(e, 0),
                 'acciones': data.get(e, 0),
                 'porcentaje_total': (data.get(e, 0) / total * 100) if total else 0,
                 'porcentaje_activo': (data.get(e, 0) / activos * 100) if activos else 0,
@@ -580,67 +2153,309 @@ def update_asistencia(id):
     votacion_id = request.args.get('votacion_id', type=int)
     if not votacion_id:
         return jsonify({'error': 'votacion_id requerido'}), 400
-    with db_lock:
-        conn = get_conn()
-        cur = conn.execute('UPDATE asistencia SET estado = ? WHERE id = ? AND votacion_id = ?', (new_estado, id, votacion_id))
-        conn.commit()
+    with writes.transaction(votacion_id) as conn:
+        version = version_asistencia(conn, votacion_id)[0] + 1
+        cur = conn.execute('UPDATE asistencia SET estado = ?, version = ? WHERE id = ? AND votacion_id = ?',
+                           (new_estado, version, id, votacion_id))
         updated = cur.rowcount
-        conn.close()
+        if updated:
+            registrar_version(conn, votacion_id, version)
     if updated:
-        socketio.emit('estado_changed', {'id': id, 'estado': new_estado})
+        actualizar_padron(votacion_id, {id: new_estado})
+        eventos.estados(votacion_id, {id: new_estado}, version=version)
         return ('', 204)
     return jsonify({'error': 'Registro no encontrado'}), 404
 
+@app.route('/api/asistencia/bulk', methods=['POST'])
+@requires_role('asistencia', 'admin')
+def update_asistencia_bulk():
+    """Aplica varios cambios de estado en una sola transacción.
+
+    Acepta ``{"cambios": [{"id": 1, "estado": "PRESENCIAL"}, ...]}`` o
+    ``{"estado": "PRESENCIAL"}`` para asignar el mismo estado a toda la votación;
+    con ``"filtro": {"estado": ..., "q": ...}`` solo a las filas que cumplen el
+    filtro de la tabla (mismo criterio que ``GET /api/asistencia``).
+    """
+    if not request.is_json:
+        return jsonify({'error': 'JSON requerido'}), 400
+    votacion_id = request.args.get('votacion_id', type=int)
+    if not votacion_id:
+        return jsonify({'error': 'votacion_id requerido'}), 400
+    data = request.get_json(silent=True) or {}
+    if 'cambios' in data:
+        try:
+            cambios = {int(c['id']): str(c.get('estado', '')).upper() for c in data['cambios']}
+        except (TypeError, ValueError, KeyError):
+            return jsonify({'error': 'Datos inválidos'}), 400
+        if any(e not in ALLOWED_ESTADOS for e in cambios.values()):
+            return jsonify({'error': 'Estado inválido'}), 400
+        with writes.transaction(votacion_id) as conn:
+            version = version_asistencia(conn, votacion_id)[0] + 1
+            cur = conn.executemany(
+                'UPDATE asistencia SET estado = ?, version = ? WHERE id = ? AND votacion_id = ?',
+                [(estado, version, id, votacion_id) for id, estado in cambios.items()]
+            )
+            updated = cur.rowcount
+            if updated:
+                registrar_version(conn, votacion_id, version)
+        evento = {'cambios': cambios}
+    else:
+        estado = str(data.get('estado', '')).upper()
+        filtro = data.get('filtro') or {}
+        if not isinstance(filtro, dict):
+            return jsonify({'error': 'Datos inválidos'}), 400
+        filtro_estado = str(filtro.get('estado') or '').upper()
+        q = str(filtro.get('q') or '').strip()
+        if estado not in ALLOWED_ESTADOS or (filtro_estado and filtro_estado not in ALLOWED_ESTADOS):
+            return jsonify({'error': 'Estado inválido'}), 400
+        with writes.transaction(votacion_id) as conn:
+            version = version_asistencia(conn, votacion_id)[0] + 1
+            if filtro_estado or q:
+                # Los ids se leen dentro de la transacción para publicar el
+                # evento con exactamente las filas cambiadas
+                condiciones, params = _filtro_asistencia(conn, votacion_id, filtro_estado, q)
+                ids = [r[0] for r in conn.execute(
+                    f'SELECT id FROM asistencia WHERE {" AND ".join(condiciones)} AND estado != ?',
+                    params + [estado])]
+                conn.executemany('UPDATE asistencia SET estado = ?, version = ? WHERE id = ?',
+                                 [(estado, version, id) for id in ids])
+                updated = len(ids)
+                evento = {'cambios': dict.fromkeys(ids, estado)}
+            else:
+                cur = conn.execute(
+                    'UPDATE asistencia SET estado = ?, version = ? WHERE votacion_id = ? AND estado != ?',
+                    (estado, version, votacion_id, estado)
+                )
+                updated = cur.rowcount
+                evento = {'todos': estado}
+            if updated:
+                registrar_version(conn, votacion_id, version)
+    if updated:
+        actualizar_padron(votacion_id, **evento)
+        eventos.estados(votacion_id, version=version, **evento)
+    return jsonify({'actualizados': updated})
+
 @app.route('/template/asistencia')
 @requires_role('asistencia', 'admin')
 def plantilla_asistencia():
     """Genera una plantilla vacía de asistencia en formato Excel."""
+    import pandas as pd
     df = pd.DataFrame(columns=['ACCIONISTA', 'REPRESENTANTE LEGAL', 'APODERADO', 'No. ACCIONES', 'ASISTENCIA'])
     output = BytesIO()
     df.to_excel(output, index=False)
     output.seek(0)
     return send_file(output, as_attachment=True, download_name='plantilla_asistencia.xlsx')
 
+EXPORT_COLUMNAS = ('id', 'votacion_id', 'accionista', 'representante', 'apoderado', 'acciones', 'estado')
+EXPORT_LOTE = 1000
+
+def _filas_exportacion(conn, votacion_id):
+    """Recorre la asistencia desde el cursor en lotes, sin cargarla completa."""
+    sql = f'SELECT {", ".join(EXPORT_COLUMNAS)} FROM asistencia'
+    cur = conn.execute(sql + ' WHERE votacion_id=? ORDER BY id', (votacion_id,)) if votacion_id \
+        else conn.execute(sql + ' ORDER BY id')
+    while True:
+        lote = cur.fetchmany(EXPORT_LOTE)
+        if not lote:
+            return
+        yield lote
+
+def _exportar_csv(votacion_id):
+    # Conexión propia: la respuesta se sigue generando después de que la
+    # vista retorna
+    with pool.connection() as conn:
+        buffer = StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(EXPORT_COLUMNAS)
+        for lote in _filas_exportacion(conn, votacion_id):
+            writer.writerows(lote)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        yield buffer.getvalue()
+
+def _exportar_excel(conn, votacion_id):
+    from openpyxl import Workbook
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet('asistencia')
+    ws.append(EXPORT_COLUMNAS)
+    for lote in _filas_exportacion(conn, votacion_id):
+        for fila in lote:
+            ws.append(tuple(fila))
+    output = BytesIO()
+    wb.save(output)
+    output.seek(0)
+    return output
+
+class ReporteCache:
+    """PDF ya generados, válidos mientras no cambie la versión de sus datos.
+
+    El dibujo se hace en un proceso aparte (``reportes.renderizar_pdf``); si
+    llegan varias peticiones del mismo reporte mientras se genera, todas
+    esperan el mismo resultado.
+    """
+
+    def __init__(self, max_entradas=32, procesos=2):
+        self.max_entradas = max_entradas
+        self.procesos = procesos
+        self._lock = threading.Lock()
+        self._pdfs = OrderedDict()
+        self._en_curso = {}
+        self._ejecutor = EjecutorProcesos(procesos)
+        self._hits = 0
+        self._generados = 0
+
+    def obtener(self, clave, datos):
+        """Devuelve el PDF de ``clave``; ``datos()`` arma la entrada solo si hay que generarlo."""
+        with self._lock:
+            pdf = self._pdfs.get(clave)
+            if pdf is not None:
+                self._pdfs.move_to_end(clave)
+                self._hits += 1
+                return pdf
+            futuro = self._en_curso.get(clave)
+        if futuro is None:
+            entrada = datos()
+            with self._lock:
+                futuro = self._en_curso.get(clave)
+                if futuro is None:
+                    futuro = self._ejecutor.get().submit(reportes.renderizar_pdf, entrada)
+                    self._en_curso[clave] = futuro
+                    self._generados += 1
+        try:
+            pdf = futuro.result(timeout=120)
+        except BrokenProcessPool:
+            # Un proceso murió (p. ej. por memoria): el siguiente reporte crea otro ejecutor
+            self._ejecutor.descartar()
+            raise
+        finally:
+            with self._lock:
+                if self._en_curso.get(clave) is futuro:
+                    del self._en_curso[clave]
+        with self._lock:
+            self._pdfs[clave] = pdf
+            self._pdfs.move_to_end(clave)
+            while len(self._pdfs) > self.max_entradas:
+                self._pdfs.popitem(last=False)
+        return pdf
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self._hits, 'generados': self._generados,
+                    'en_cache': len(self._pdfs), 'en_curso': len(self._en_curso)}
+
+
+pdfs = ReporteCache(procesos=int(os.environ.get('REPORTES_PROCESOS', 2)))
+
+def _version_reporte(conn, votacion_id):
+    """Clave que cambia cuando cambian la asistencia, los votos o la boleta."""
+    if votacion_id:
+        version = version_asistencia(conn, votacion_id)[0]
+        votos = conn.execute('SELECT COUNT(*), COALESCE(MAX(id), 0) FROM votos WHERE votacion_id=?',
+                             (votacion_id,)).fetchone()
+        nombre = conn.execute('SELECT nombre FROM votaciones WHERE id=?', (votacion_id,)).fetchone()
+        etag, _ = boletas.get(votacion_id, conn)
+        return (votacion_id, version, tuple(votos), nombre[0] if nombre else None, etag)
+    version = conn.execute('SELECT COALESCE(SUM(version), 0) FROM asistencia_versiones').fetchone()[0]
+    votos = conn.execute('SELECT COUNT(*), COALESCE(MAX(id), 0) FROM votos').fetchone()
+    return (None, version, tuple(votos))
+
+def _datos_reporte(conn, votacion_id):
+    filtro = 'WHERE votacion_id=? AND registros > 0' if votacion_id else 'WHERE registros > 0'
+    rows = conn.execute(
+        f'SELECT estado, SUM(registros) AS registros, SUM(acciones) AS acciones '
+        f'FROM asistencia_resumen {filtro} GROUP BY estado',
+        (votacion_id,) if votacion_id else ()
+    ).fetchall()
+    por_estado = {r['estado']: {'registros': r['registros'], 'acciones': r['acciones']} for r in rows}
+    if votacion_id:
+        nombre = conn.execute('SELECT nombre FROM votaciones WHERE id=?', (votacion_id,)).fetchone()
+        activos, preguntas = resultados_preguntas(votacion_id, conn)
+        titulo = nombre['nombre'] if nombre else f'Votación {votacion_id}'
+    else:
+        activos = sum(v['acciones'] for e, v in por_estado.items() if e in ESTADOS_ACTIVOS)
+        preguntas = []
+        titulo = 'Asistencia'
+    return {'titulo': titulo, 'por_estado': por_estado, 'acciones_activas': activos, 'preguntas': preguntas}
+
 @app.route('/export/<fmt>')
 @requires_role('asistencia', 'admin')
 def export(fmt):
+    """Exporta la asistencia generando el archivo por petición, sin archivos en disco.
+
+    El CSV se envía por partes mientras se lee el cursor; el Excel se escribe
+    con el modo ``write_only`` de openpyxl, que no mantiene las celdas en memoria.
+    """
     votacion_id = request.args.get('votacion_id', type=int)
+    base = f'asistencia_votacion_{votacion_id}' if votacion_id else 'asistencia_export'
+    if fmt == 'csv':
+        return Response(stream_with_context(_exportar_csv(votacion_id)), mimetype='text/csv',
+                        headers={'Content-Disposition': f'attachment; filename={base}.csv'})
     conn = get_conn()
-    if votacion_id:
-        df = pd.read_sql('SELECT * FROM asistencia WHERE votacion_id=?', conn, params=(votacion_id,))
-    else:
-        df = pd.read_sql('SELECT * FROM asistencia', conn)
-    conn.close()
-    base = 'asistencia_export'
     if fmt == 'excel':
-        fname = f"{base}.xlsx"
-        df.to_excel(fname, index=False)
-    elif fmt == 'csv':
-        fname = f"{base}.csv"
-        df.to_csv(fname, index=False)
-    elif fmt == 'pdf' and HAS_MPL:
-        fname = f"{base}.pdf"
-        with PdfPages(fname) as pdf:
-            fig, ax = plt.subplots(figsize=(4, 4))
-            df['estado'].value_counts().plot.pie(ax=ax, autopct='%1.1f%%')
-            ax.set_ylabel('')
-            pdf.savefig(fig)
-            plt.close(fig)
-
-            fig2, ax2 = plt.subplots(figsize=(5, 3))
-            df.groupby('estado')['acciones'].sum().plot.bar(ax=ax2)
-            ax2.set_ylabel('Total Acciones')
-            pdf.savefig(fig2)
-            plt.close(fig2)
-    else:
-        return 'Formato no soportado', 400
-    return send_file(fname, as_attachment=True)
+        return send_file(_exportar_excel(conn, votacion_id), as_attachment=True, download_name=f'{base}.xlsx')
+    if fmt == 'pdf' and reportes.HAS_MPL:
+        try:
+            pdf = pdfs.obtener(_version_reporte(conn, votacion_id), lambda: _datos_reporte(conn, votacion_id))
+        except Exception:
+            app.logger.exception('Error al generar el reporte PDF')
+            return jsonify({'error': 'No se pudo generar el reporte'}), 500
+        return send_file(BytesIO(pdf), mimetype='application/pdf', as_attachment=True,
+                         download_name=f'{base}.pdf')
+    return 'Formato no soportado', 400
+
+
+def _voto_no_permitido(conn, votacion_id):
+    """Verifica quórum y permiso; devuelve la respuesta de error o ``None``."""
+    total, activos, _ = resumen_acciones(votacion_id, conn)
+    q_row = conn.execute('SELECT quorum_minimo FROM votaciones WHERE id=?', (votacion_id,)).fetchone()
+    quorum_minimo = q_row['quorum_minimo'] if q_row else 0
+    if not permisos.tiene(g.user['id'], votacion_id, 'votante'):
+        return jsonify({'error': 'No autorizado'}), 403
+    if total == 0 or (activos / total * 100) < quorum_minimo:
+        return jsonify({'error': 'Quórum no alcanzado'}), 403
+    return None
+
+
+def _opciones_validas(conn, votacion_id, pregunta_id):
+    _, boleta = boletas.get(votacion_id, conn)
+    return {o['id'] for p in boleta if p['id'] == pregunta_id for o in p['opciones']}
+
+def _registrar(conn, votacion_id, pregunta_id, votos):
+    """Valida ``votos`` (``(asistencia_id, opcion_id, acciones_enviadas)``) contra el padrón y los inserta.
+
+    Devuelve la respuesta de error o ``None``. El peso de cada voto sale del
+    padrón; si el cliente envía ``acciones`` debe coincidir.
+    """
+    validas = _opciones_validas(conn, votacion_id, pregunta_id)
+    if any(opcion_id not in validas for _, opcion_id, _ in votos):
+        return jsonify({'error': 'Opción inválida'}), 400
+    try:
+        pesos = padron.reservar(votacion_id, pregunta_id, [(a, acciones) for a, _, acciones in votos], conn)
+    except VotoRechazado as exc:
+        return jsonify({'error': str(exc)}), exc.status
+    user_id = g.user['id']
+    filas = [(votacion_id, pregunta_id, opcion_id, peso, user_id, asistencia_id)
+             for (asistencia_id, opcion_id, _), peso in zip(votos, pesos)]
+    try:
+        insertar_votos(votacion_id, filas, conn)
+    except sqlite3.IntegrityError:
+        # El índice único detectó un voto que la memoria no conocía (p. ej. otro worker)
+        padron.liberar(votacion_id, pregunta_id, [a for a, _, _ in votos])
+        padron.invalidate(votacion_id)
+        return jsonify({'error': 'El asistente ya votó esta pregunta'}), 409
+    except Exception:
+        padron.liberar(votacion_id, pregunta_id, [a for a, _, _ in votos])
+        raise
+    eventos.votos(votacion_id, [(pregunta_id, opcion_id, peso, 1) for _, _, opcion_id, peso, _, _ in filas])
+    return None
 
 
 @app.route('/api/votar', methods=['POST'])
+@medir_latencia('votar')
 @requires_role('votante')
 def registrar_voto():
-    """Registra un voto asociando número de acciones a una opción."""
+    """Registra el voto de un asistente; las acciones se toman del registro de asistencia."""
     if not request.is_json:
         return jsonify({'error': 'JSON requerido'}), 400
     data = request.get_json(silent=True) or {}
@@ -648,56 +2463,68 @@ def registrar_voto():
         votacion_id = int(data.get('votacion_id'))
         pregunta_id = int(data.get('pregunta_id'))
         opcion_id = int(data.get('opcion_id'))
-        acciones = int(data.get('acciones'))
+        asistencia_id = int(data.get('asistencia_id'))
+        acciones = int(data['acciones']) if data.get('acciones') is not None else None
     except (TypeError, ValueError):
         return jsonify({'error': 'Datos inválidos'}), 400
-    # Verifica quórum y permiso antes de permitir votar
-    total, activos, _ = resumen_acciones(votacion_id)
     conn = get_conn()
-    q_row = conn.execute('SELECT quorum_minimo FROM votaciones WHERE id=?', (votacion_id,)).fetchone()
-    perm = conn.execute('SELECT 1 FROM usuarios_votacion WHERE votacion_id=? AND user_id=? AND rol="votante"', (votacion_id, g.user['id'])).fetchone()
-    conn.close()
-    quorum_minimo = q_row['quorum_minimo'] if q_row else 0
-    if not perm:
-        return jsonify({'error': 'No autorizado'}), 403
-    if total == 0 or (activos / total * 100) < quorum_minimo:
-        return jsonify({'error': 'Quórum no alcanzado'}), 403
-    with db_lock:
-        conn = get_conn()
-        conn.execute(
-            'INSERT INTO votos (votacion_id, pregunta_id, opcion_id, acciones, user_id) VALUES (?,?,?,?,?)',
-            (votacion_id, pregunta_id, opcion_id, acciones, g.user['id'])
-        )
-        conn.commit()
-        conn.close()
-    socketio.emit('voto_registrado', {
-        'votacion_id': votacion_id,
-        'pregunta_id': pregunta_id,
-        'opcion_id': opcion_id,
-        'acciones': acciones,
-    })
+    error = _voto_no_permitido(conn, votacion_id) or \
+        _registrar(conn, votacion_id, pregunta_id, [(asistencia_id, opcion_id, acciones)])
+    if error:
+        return error
     return jsonify({'status': 'ok'})
 
 
+@app.route('/api/votar/batch', methods=['POST'])
+@medir_latencia('votar_batch')
+@requires_role('votante')
+def registrar_votos_lote():
+    """Registra todos los votos de una pregunta en una sola transacción.
+
+    ``{votacion_id, pregunta_id, votos: [{asistencia_id, opcion_id}]}``; si un
+    voto no es válido no se registra ninguno.
+    """
+    if not request.is_json:
+        return jsonify({'error': 'JSON requerido'}), 400
+    data = request.get_json(silent=True) or {}
+    try:
+        votacion_id = int(data.get('votacion_id'))
+        pregunta_id = int(data.get('pregunta_id'))
+        votos = [(int(v['asistencia_id']), int(v['opcion_id']),
+                  int(v['acciones']) if v.get('acciones') is not None else None)
+                 for v in data.get('votos') or []]
+    except (TypeError, ValueError, KeyError):
+        return jsonify({'error': 'Datos inválidos'}), 400
+    if not votos:
+        return jsonify({'error': 'Sin votos'}), 400
+    conn = get_conn()
+    error = _voto_no_permitido(conn, votacion_id) or _registrar(conn, votacion_id, pregunta_id, votos)
+    if error:
+        return error
+    return jsonify({'status': 'ok', 'registrados': len(votos)})
+
+
 @app.route('/api/resultados/<int:votacion_id>')
 @requires_role('votante', 'admin')
 def resultados_votacion(votacion_id):
     """Resumen de resultados por pregunta basados en acciones activas."""
-    total, activos, _ = resumen_acciones(votacion_id)
-    conn = get_conn()
+    activos, preguntas = resultados_preguntas(votacion_id, get_conn())
+    return jsonify({'acciones_activas': activos, 'preguntas': preguntas})
+
+def resultados_preguntas(votacion_id, conn):
+    """Devuelve ``(acciones_activas, preguntas)`` con acciones y porcentaje por opción."""
+    total, activos, _ = resumen_acciones(votacion_id, conn)
     rows = conn.execute(
         '''SELECT p.id AS pregunta_id, p.texto AS pregunta,
                   o.id AS opcion_id, o.texto AS opcion,
-                  COALESCE(SUM(v.acciones),0) AS acciones
+                  COALESCE(t.acciones, 0) AS acciones
            FROM preguntas p
            JOIN opciones o ON o.pregunta_id = p.id
-           LEFT JOIN votos v ON v.opcion_id = o.id
+           LEFT JOIN votos_totales t ON t.opcion_id = o.id
            WHERE p.votacion_id = ?
-           GROUP BY o.id
            ORDER BY p.id, o.id''',
         (votacion_id,)
     ).fetchall()
-    conn.close()
     preguntas = []
     current = None
     for r in rows:
@@ -707,8 +2534,106 @@ def resultados_votacion(votacion_id):
         acc = r['acciones'] or 0
         pct = (acc / activos * 100) if activos else 0
         current['opciones'].append({'id': r['opcion_id'], 'texto': r['opcion'], 'acciones': acc, 'porcentaje': pct})
-    return jsonify({'acciones_activas': activos, 'preguntas': preguntas})
+    return activos, preguntas
+
+@app.cli.command('reconciliar-votos')
+@click.option('--corregir', is_flag=True, help='Reescribe los totales que no coincidan.')
+def reconciliar_votos(corregir):
+    """Recalcula los totales por opción desde votos y los compara con votos_totales."""
+    with pool.connection() as conn:
+        esperados = {r['opcion_id']: (r['acciones'], r['votos']) for r in conn.execute(
+            'SELECT opcion_id, SUM(acciones) AS acciones, COUNT(*) AS votos FROM votos GROUP BY opcion_id'
+        )}
+        actuales = {r['opcion_id']: (r['acciones'], r['votos']) for r in conn.execute(
+            'SELECT opcion_id, acciones, votos FROM votos_totales WHERE votos != 0 OR acciones != 0'
+        )}
+        diferencias = sorted(
+            (oid, actuales.get(oid, (0, 0)), esperados.get(oid, (0, 0)))
+            for oid in set(esperados) | set(actuales)
+            if actuales.get(oid, (0, 0)) != esperados.get(oid, (0, 0))
+        )
+        for oid, actual, esperado in diferencias:
+            click.echo(f'opcion {oid}: votos_totales={actual} votos={esperado}')
+        if not diferencias:
+            click.echo('Totales de votos consistentes')
+            return
+        if corregir:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.execute('DELETE FROM votos_totales')
+            conn.execute(
+                'INSERT INTO votos_totales (opcion_id, acciones, votos) '
+                'SELECT opcion_id, SUM(acciones), COUNT(*) FROM votos GROUP BY opcion_id'
+            )
+            conn.commit()
+            click.echo(f'{len(diferencias)} totales corregidos')
+        else:
+            raise SystemExit(1)
+
+@socketio.on('unirse')
+def unirse_votacion(data):
+    """Suscribe al cliente a la sala de una votación (y lo saca de las demás)."""
+    uid = session.get('user_id')
+    try:
+        votacion_id = int((data or {}).get('votacion_id'))
+    except (TypeError, ValueError):
+        return {'error': 'votacion_id requerido'}
+    if not uid:
+        return {'error': 'No autorizado'}
+    user = usuarios.get(uid, get_conn)
+    if not user:
+        return {'error': 'No autorizado'}
+    if user['role'] != 'admin' and not permisos.tiene(uid, votacion_id):
+        return {'error': 'No autorizado'}
+    for room in rooms():
+        if room.startswith('votacion_') and room != sala(votacion_id):
+            leave_room(room)
+    join_room(sala(votacion_id))
+    return {'ok': True}
+
+@app.route('/api/admin/estadisticas')
+@requires_role('admin')
+def estadisticas():
+    """Métricas internas del servidor para ajustar la configuración."""
+    return jsonify({'db_pool': pool.stats(), 'escrituras': writes.stats(), 'eventos': eventos.stats(),
+                    'reportes': pdfs.stats(), 'usuarios': usuarios.stats(),
+                    'permisos': permisos.stats(), 'padron': padron.stats(), 'hashes': hashes.stats(),
+                    'login': verificaciones.stats(), 'latencias': latencias.stats(),
+                    'votos_agrupados': votos_buffer.stats() if votos_buffer else None})
+
+def lanzar_workers(n, puerto):
+    """Arranca el broker y n procesos de la app en puertos consecutivos."""
+    # Solo en loopback y con una clave nueva por arranque, no derivada de
+    # SECRET_KEY: quien se autentica puede enviar objetos pickle arbitrarios
+    clave = secrets.token_bytes(32)
+    broker = LocalBroker(('127.0.0.1', 0), authkey=clave).start()
+    host, port = broker.address
+    env = dict(os.environ, SOCKETIO_BROKER=f'{host}:{port}', SOCKETIO_BROKER_KEY=clave.hex())
+    procesos = [subprocess.Popen([sys.executable, os.path.abspath(__file__)],
+                                 env=dict(env, PORT=str(puerto + i)))
+                for i in range(n)]
+    print(f'{n} workers en los puertos {puerto}-{puerto + n - 1} (broker {host}:{port})')
+    try:
+        for p in procesos:
+            p.wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for p in procesos:
+            p.terminate()
+        for p in procesos:
+            p.wait()
+        broker.close()
 
 if __name__ == '__main__':
-    debug_mode = os.environ.get('FLASK_DEBUG') == '1'
-    socketio.run(app, host='0.0.0.0', port=5000, debug=debug_mode)
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--port', type=int, default=int(os.environ.get('PORT', 5000)))
+    args = parser.parse_args()
+    if args.workers > 1:
+        lanzar_workers(args.workers, args.port)
+    else:
+        debug_mode = os.environ.get('FLASK_DEBUG') == '1'
+        escuchar_broker()
+        # Los workers lanzados por lanzar_workers no tienen terminal asociada
+        socketio.run(app, host='0.0.0.0', port=args.port, debug=debug_mode,
+                     allow_unsafe_werkzeug=bool(BROKER))
@@ -0,0 +1,71 @@
+"""Mide el arranque en frío de app.py con ``python -X importtime``.
+
+Uso::
+
+    python bench_startup.py [--umbral-ms 1000] [--repeticiones 5]
+
+Importa ``app`` en procesos nuevos y toma la mediana del tiempo acumulado.
+Termina con código 1 si supera el umbral o si al arrancar se cargan módulos
+que solo deben importarse al usarse (pandas, matplotlib).
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+DIRECTORIO = os.path.dirname(os.path.abspath(__file__))
+CARGA_DIFERIDA = ('pandas', 'matplotlib')
+
+
+def medir():
+    """Devuelve ``{modulo: (propio_us, acumulado_us, profundidad)}`` de un arranque."""
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'],
+                          cwd=DIRECTORIO, capture_output=True, text=True)
+    if proc.returncode != 0:
+        sys.stderr.write(proc.stderr)
+        raise SystemExit('No se pudo importar app.py')
+    modulos = {}
+    for linea in proc.stderr.splitlines():
+        if not linea.startswith('import time:') or 'cumulative' in linea:
+            continue
+        propio, acumulado, nombre = linea[len('import time:'):].split('|')
+        profundidad = (len(nombre) - len(nombre.lstrip())) // 2
+        modulos[nombre.strip()] = (int(propio), int(acumulado), profundidad)
+    return modulos
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--umbral-ms', type=float, default=1000)
+    parser.add_argument('--repeticiones', type=int, default=5)
+    args = parser.parse_args()
+
+    medir()  # genera los .pyc para que todas las mediciones partan igual
+    corridas = [medir() for _ in range(args.repeticiones)]
+    tiempos = [c['app'][1] / 1000 for c in corridas]
+    mediana = statistics.median(tiempos)
+
+    ultima = corridas[-1]
+    directos = sorted((v[1], k) for k, v in ultima.items() if v[2] == 1)
+    print('Importaciones más costosas de app.py:')
+    for acumulado, nombre in reversed(directos[-10:]):
+        print(f'  {acumulado / 1000:8.1f} ms  {nombre}')
+    print(f'import app: mediana {mediana:.1f} ms (min {min(tiempos):.1f}, max {max(tiempos):.1f}), '
+          f'umbral {args.umbral_ms:.0f} ms')
+
+    fallo = False
+    cargados = sorted({m.split('.')[0] for m in ultima} & set(CARGA_DIFERIDA))
+    if cargados:
+        print(f"❌ Se importan al arrancar: {', '.join(cargados)}")
+        fallo = True
+    if mediana > args.umbral_ms:
+        print('❌ El arranque supera el umbral')
+        fallo = True
+    if fallo:
+        raise SystemExit(1)
+    print('✅ Arranque dentro del umbral')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,124 +1,394 @@
 import sqlite3
+import sys
 from werkzeug.security import generate_password_hash
 
-# Crea o abre la base
-conn = sqlite3.connect('db.sqlite')
-c = conn.cursor()
-# Usuarios
-c.execute('''
-CREATE TABLE IF NOT EXISTS users (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    username TEXT UNIQUE NOT NULL,
-    password TEXT NOT NULL,
-    cedula TEXT UNIQUE,
-    role TEXT CHECK(role IN ('admin','asistencia','votante')) NOT NULL
-)
-''')
-
-# Asegura columnas opcionales en instalaciones existentes
-# Verifica si la columna 'cedula' existe y la agrega si falta
-existing_cols = [row[1] for row in c.execute("PRAGMA table_info(users)").fetchall()]
-if 'cedula' not in existing_cols:
-    try:
-        c.execute("ALTER TABLE users ADD COLUMN cedula TEXT UNIQUE")
-        print("✅ Columna 'cedula' añadida a la tabla users")
-    except sqlite3.OperationalError as exc:
-        print(f"❌ No se pudo crear la columna 'cedula': {exc}")
-        print("Ejecute manualmente: ALTER TABLE users ADD COLUMN cedula TEXT UNIQUE")
-        conn.close()
-        raise SystemExit(1)
-
-# Votaciones
-c.execute('''
-CREATE TABLE IF NOT EXISTS votaciones (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    nombre TEXT NOT NULL,
-    fecha TEXT,
-    quorum_minimo REAL DEFAULT 0
-)
-''')
-
-# Asegura columnas opcionales
-for col, definition in (
-    ('fecha', "ALTER TABLE votaciones ADD COLUMN fecha TEXT"),
-    ('quorum_minimo', "ALTER TABLE votaciones ADD COLUMN quorum_minimo REAL DEFAULT 0"),
-):
+def crear_tablas(conn):
+    """Crea las tablas base (las anteriores a las migraciones) si no existen."""
+    c = conn.cursor()
+    # Usuarios
+    c.execute('''
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT UNIQUE NOT NULL,
+        password TEXT NOT NULL,
+        cedula TEXT UNIQUE,
+        role TEXT CHECK(role IN ('admin','asistencia','votante')) NOT NULL
+    )
+    ''')
+
+    # Asegura columnas opcionales en instalaciones existentes
+    # Verifica si la columna 'cedula' existe y la agrega si falta
+    existing_cols = [row[1] for row in c.execute("PRAGMA table_info(users)").fetchall()]
+    if 'cedula' not in existing_cols:
+        try:
+            c.execute("ALTER TABLE users ADD COLUMN cedula TEXT UNIQUE")
+            print("✅ Columna 'cedula' añadida a la tabla users")
+        except sqlite3.OperationalError as exc:
+            print(f"❌ No se pudo crear la columna 'cedula': {exc}")
+            print("Ejecute manualmente: ALTER TABLE users ADD COLUMN cedula TEXT UNIQUE")
+            conn.close()
+            raise SystemExit(1)
+
+    # Votaciones
+    c.execute('''
+    CREATE TABLE IF NOT EXISTS votaciones (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        nombre TEXT NOT NULL,
+        fecha TEXT,
+        quorum_minimo REAL DEFAULT 0
+    )
+    ''')
+
+    # Asegura columnas opcionales
+    for col, definition in (
+        ('fecha', "ALTER TABLE votaciones ADD COLUMN fecha TEXT"),
+        ('quorum_minimo', "ALTER TABLE votaciones ADD COLUMN quorum_minimo REAL DEFAULT 0"),
+    ):
+        try:
+            c.execute(definition)
+        except sqlite3.OperationalError:
+            pass
+
+    # Tabla de asistencia (por votación)
+    c.execute('''
+    CREATE TABLE IF NOT EXISTS asistencia (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        votacion_id INTEGER NOT NULL,
+        accionista TEXT,
+        representante TEXT,
+        apoderado TEXT,
+        acciones INTEGER,
+        estado TEXT CHECK(estado IN ('PRESENCIAL','VIRTUAL','AUSENTE')) NOT NULL DEFAULT 'AUSENTE',
+        FOREIGN KEY(votacion_id) REFERENCES votaciones(id)
+    )
+    ''')
+
+    # Preguntas
+    c.execute('''
+    CREATE TABLE IF NOT EXISTS preguntas (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        votacion_id INTEGER NOT NULL,
+        texto TEXT NOT NULL,
+        FOREIGN KEY(votacion_id) REFERENCES votaciones(id)
+    )
+    ''')
+
+    # Opciones por pregunta
+    c.execute('''
+    CREATE TABLE IF NOT EXISTS opciones (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        pregunta_id INTEGER NOT NULL,
+        texto TEXT NOT NULL,
+        FOREIGN KEY(pregunta_id) REFERENCES preguntas(id)
+    )
+    ''')
+
+    # Asignaciones de usuarios a votaciones
+    c.execute('''
+    CREATE TABLE IF NOT EXISTS usuarios_votacion (
+        votacion_id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        rol TEXT CHECK(rol IN ('asistencia','votante')) NOT NULL,
+        PRIMARY KEY (votacion_id, user_id, rol),
+        FOREIGN KEY(votacion_id) REFERENCES votaciones(id),
+        FOREIGN KEY(user_id) REFERENCES users(id)
+    )
+    ''')
+
+    # Registro de votos por pregunta/opción
+    c.execute('''
+    CREATE TABLE IF NOT EXISTS votos (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        votacion_id INTEGER NOT NULL,
+        pregunta_id INTEGER NOT NULL,
+        opcion_id INTEGER NOT NULL,
+        acciones INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        timestamp TEXT DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY(votacion_id) REFERENCES votaciones(id),
+        FOREIGN KEY(pregunta_id) REFERENCES preguntas(id),
+        FOREIGN KEY(opcion_id) REFERENCES opciones(id),
+        FOREIGN KEY(user_id) REFERENCES users(id)
+    )
+    ''')
+
+
+# --- Migraciones versionadas (PRAGMA user_version) ---
+# Cada migración se aplica una sola vez, en orden y dentro de su propia
+# transacción. Usan IF NOT EXISTS para poder ejecutarse sobre bases creadas
+# con versiones anteriores de este script.
+
+def fts5_disponible(conn):
     try:
-        c.execute(definition)
+        conn.execute('CREATE VIRTUAL TABLE temp.prueba_fts5 USING fts5(x)')
+        conn.execute('DROP TABLE temp.prueba_fts5')
+        return True
     except sqlite3.OperationalError:
-        pass
+        return False
 
-# Tabla de asistencia (por votación)
-c.execute('''
-CREATE TABLE IF NOT EXISTS asistencia (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    votacion_id INTEGER NOT NULL,
-    accionista TEXT,
-    representante TEXT,
-    apoderado TEXT,
-    acciones INTEGER,
-    estado TEXT CHECK(estado IN ('PRESENCIAL','VIRTUAL','AUSENTE')) NOT NULL DEFAULT 'AUSENTE',
-    FOREIGN KEY(votacion_id) REFERENCES votaciones(id)
-)
-''')
-
-# Preguntas
-c.execute('''
-CREATE TABLE IF NOT EXISTS preguntas (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    votacion_id INTEGER NOT NULL,
-    texto TEXT NOT NULL,
-    FOREIGN KEY(votacion_id) REFERENCES votaciones(id)
-)
-''')
-
-# Opciones por pregunta
-c.execute('''
-CREATE TABLE IF NOT EXISTS opciones (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    pregunta_id INTEGER NOT NULL,
-    texto TEXT NOT NULL,
-    FOREIGN KEY(pregunta_id) REFERENCES preguntas(id)
-)
-''')
-
-# Asignaciones de usuarios a votaciones
-c.execute('''
-CREATE TABLE IF NOT EXISTS usuarios_votacion (
-    votacion_id INTEGER NOT NULL,
-    user_id INTEGER NOT NULL,
-    rol TEXT CHECK(rol IN ('asistencia','votante')) NOT NULL,
-    PRIMARY KEY (votacion_id, user_id, rol),
-    FOREIGN KEY(votacion_id) REFERENCES votaciones(id),
-    FOREIGN KEY(user_id) REFERENCES users(id)
-)
-''')
-
-# Registro de votos por pregunta/opción
-c.execute('''
-CREATE TABLE IF NOT EXISTS votos (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
+
+# Índice de texto completo sobre los nombres de asistencia. Los nombres solo
+# cambian al importar, así que app.py lo actualiza en bloque dentro de esa
+# transacción (un trigger por fila multiplica el tiempo de importación). Si
+# este SQLite no trae FTS5 la búsqueda de app.py recurre a LIKE.
+SQL_ASISTENCIA_FTS = '''
+CREATE VIRTUAL TABLE IF NOT EXISTS asistencia_fts USING fts5(
+    accionista, representante, apoderado,
+    content='asistencia', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2'
+);
+
+INSERT INTO asistencia_fts (asistencia_fts) VALUES ('rebuild');
+''' if fts5_disponible(sqlite3.connect(':memory:')) else ''
+
+MIGRACIONES = [
+    (1, 'Totales de acciones por estado y votación (asistencia_resumen)', '''
+CREATE TABLE IF NOT EXISTS asistencia_resumen (
     votacion_id INTEGER NOT NULL,
-    pregunta_id INTEGER NOT NULL,
-    opcion_id INTEGER NOT NULL,
-    acciones INTEGER NOT NULL,
-    user_id INTEGER NOT NULL,
-    timestamp TEXT DEFAULT CURRENT_TIMESTAMP,
-    FOREIGN KEY(votacion_id) REFERENCES votaciones(id),
-    FOREIGN KEY(pregunta_id) REFERENCES preguntas(id),
-    FOREIGN KEY(opcion_id) REFERENCES opciones(id),
-    FOREIGN KEY(user_id) REFERENCES users(id)
-)
-''')
-
-# Usuario administrador por defecto
-c.execute("SELECT id FROM users WHERE username='admin'")
-if not c.fetchone():
-    c.execute(
-        "INSERT INTO users (username, password, role) VALUES (?,?,?)",
-        ('admin', generate_password_hash('admin'), 'admin')
-    )
+    estado TEXT NOT NULL,
+    acciones INTEGER NOT NULL DEFAULT 0,
+    registros INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (votacion_id, estado)
+);
+
+CREATE TRIGGER IF NOT EXISTS asistencia_resumen_ins AFTER INSERT ON asistencia
+BEGIN
+    INSERT INTO asistencia_resumen (votacion_id, estado, acciones, registros)
+    VALUES (NEW.votacion_id, NEW.estado, COALESCE(NEW.acciones, 0), 1)
+    ON CONFLICT(votacion_id, estado) DO UPDATE SET
+        acciones = acciones + excluded.acciones,
+        registros = registros + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS asistencia_resumen_del AFTER DELETE ON asistencia
+BEGIN
+    UPDATE asistencia_resumen
+       SET acciones = acciones - COALESCE(OLD.acciones, 0), registros = registros - 1
+     WHERE votacion_id = OLD.votacion_id AND estado = OLD.estado;
+END;
+
+CREATE TRIGGER IF NOT EXISTS asistencia_resumen_upd
+AFTER UPDATE OF votacion_id, estado, acciones ON asistencia
+BEGIN
+    UPDATE asistencia_resumen
+       SET acciones = acciones - COALESCE(OLD.acciones, 0), registros = registros - 1
+     WHERE votacion_id = OLD.votacion_id AND estado = OLD.estado;
+    INSERT INTO asistencia_resumen (votacion_id, estado, acciones, registros)
+    VALUES (NEW.votacion_id, NEW.estado, COALESCE(NEW.acciones, 0), 1)
+    ON CONFLICT(votacion_id, estado) DO UPDATE SET
+        acciones = acciones + excluded.acciones,
+        registros = registros + 1;
+END;
+
+DELETE FROM asistencia_resumen;
+INSERT INTO asistencia_resumen (votacion_id, estado, acciones, registros)
+SELECT votacion_id, estado, COALESCE(SUM(acciones), 0), COUNT(*)
+FROM asistencia GROUP BY votacion_id, estado;
+'''),
+    (2, 'Totales de votos por opción (votos_totales)', '''
+CREATE TABLE IF NOT EXISTS votos_totales (
+    opcion_id INTEGER PRIMARY KEY,
+    acciones INTEGER NOT NULL DEFAULT 0,
+    votos INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TRIGGER IF NOT EXISTS votos_totales_ins AFTER INSERT ON votos
+BEGIN
+    INSERT INTO votos_totales (opcion_id, acciones, votos)
+    VALUES (NEW.opcion_id, NEW.acciones, 1)
+    ON CONFLICT(opcion_id) DO UPDATE SET
+        acciones = acciones + excluded.acciones,
+        votos = votos + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS votos_totales_del AFTER DELETE ON votos
+BEGIN
+    UPDATE votos_totales
+       SET acciones = acciones - OLD.acciones, votos = votos - 1
+     WHERE opcion_id = OLD.opcion_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS votos_totales_upd AFTER UPDATE OF opcion_id, acciones ON votos
+BEGIN
+    UPDATE votos_totales
+       SET acciones = acciones - OLD.acciones, votos = votos - 1
+     WHERE opcion_id = OLD.opcion_id;
+    INSERT INTO votos_totales (opcion_id, acciones, votos)
+    VALUES (NEW.opcion_id, NEW.acciones, 1)
+    ON CONFLICT(opcion_id) DO UPDATE SET
+        acciones = acciones + excluded.acciones,
+        votos = votos + 1;
+END;
+
+DELETE FROM votos_totales;
+INSERT INTO votos_totales (opcion_id, acciones, votos)
+SELECT opcion_id, SUM(acciones), COUNT(*) FROM votos GROUP BY opcion_id;
+'''),
+    (3, 'Índices para las consultas frecuentes', '''
+CREATE INDEX IF NOT EXISTS idx_asistencia_votacion_estado ON asistencia (votacion_id, estado);
+CREATE INDEX IF NOT EXISTS idx_votos_opcion ON votos (opcion_id);
+CREATE INDEX IF NOT EXISTS idx_votos_votacion_pregunta ON votos (votacion_id, pregunta_id);
+CREATE INDEX IF NOT EXISTS idx_preguntas_votacion ON preguntas (votacion_id);
+CREATE INDEX IF NOT EXISTS idx_opciones_pregunta ON opciones (pregunta_id);
+CREATE INDEX IF NOT EXISTS idx_usuarios_votacion_user ON usuarios_votacion (user_id, rol, votacion_id);
+'''),
+    (4, 'Versión de cambios de asistencia para sincronización incremental', '''
+ALTER TABLE asistencia ADD COLUMN version INTEGER NOT NULL DEFAULT 0;
+CREATE TABLE IF NOT EXISTS asistencia_versiones (
+    votacion_id INTEGER PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0,
+    reinicio INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_asistencia_votacion_version ON asistencia (votacion_id, version);
+'''),
+    (5, 'Paginación por id y búsqueda de texto en asistencia', '''
+CREATE INDEX IF NOT EXISTS idx_asistencia_votacion ON asistencia (votacion_id);
+''' + SQL_ASISTENCIA_FTS),
+    (6, 'Conteos por votación para el panel de administración (votaciones_resumen)', '''
+CREATE TABLE IF NOT EXISTS votaciones_resumen (
+    votacion_id INTEGER PRIMARY KEY,
+    preguntas INTEGER NOT NULL DEFAULT 0,
+    asistentes INTEGER NOT NULL DEFAULT 0,
+    votantes INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TRIGGER IF NOT EXISTS votaciones_resumen_votacion_ins AFTER INSERT ON votaciones
+BEGIN
+    INSERT OR IGNORE INTO votaciones_resumen (votacion_id) VALUES (NEW.id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS votaciones_resumen_votacion_del AFTER DELETE ON votaciones
+BEGIN
+    DELETE FROM votaciones_resumen WHERE votacion_id = OLD.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS votaciones_resumen_pregunta_ins AFTER INSERT ON preguntas
+BEGIN
+    INSERT INTO votaciones_resumen (votacion_id, preguntas) VALUES (NEW.votacion_id, 1)
+    ON CONFLICT(votacion_id) DO UPDATE SET preguntas = preguntas + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS votaciones_resumen_pregunta_del AFTER DELETE ON preguntas
+BEGIN
+    UPDATE votaciones_resumen SET preguntas = preguntas - 1 WHERE votacion_id = OLD.votacion_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS votaciones_resumen_asignacion_ins AFTER INSERT ON usuarios_votacion
+BEGIN
+    INSERT INTO votaciones_resumen (votacion_id, asistentes, votantes)
+    VALUES (NEW.votacion_id, NEW.rol = 'asistencia', NEW.rol = 'votante')
+    ON CONFLICT(votacion_id) DO UPDATE SET
+        asistentes = asistentes + excluded.asistentes,
+        votantes = votantes + excluded.votantes;
+END;
+
+CREATE TRIGGER IF NOT EXISTS votaciones_resumen_asignacion_del AFTER DELETE ON usuarios_votacion
+BEGIN
+    UPDATE votaciones_resumen
+       SET asistentes = asistentes - (OLD.rol = 'asistencia'),
+           votantes = votantes - (OLD.rol = 'votante')
+     WHERE votacion_id = OLD.votacion_id;
+END;
+
+DELETE FROM votaciones_resumen;
+INSERT INTO votaciones_resumen (votacion_id, preguntas, asistentes, votantes)
+SELECT v.id,
+       (SELECT COUNT(*) FROM preguntas p WHERE p.votacion_id = v.id),
+       (SELECT COUNT(*) FROM usuarios_votacion vu WHERE vu.votacion_id = v.id AND vu.rol = 'asistencia'),
+       (SELECT COUNT(*) FROM usuarios_votacion vu WHERE vu.votacion_id = v.id AND vu.rol = 'votante')
+FROM votaciones v;
+'''),
+    (7, 'Votos por asistente: un voto por pregunta y asistente', '''
+ALTER TABLE votos ADD COLUMN asistencia_id INTEGER;
+CREATE UNIQUE INDEX IF NOT EXISTS idx_votos_pregunta_asistencia ON votos (pregunta_id, asistencia_id);
+'''),
+]
+
+# Consultas frecuentes de app.py que deben resolverse con un índice
+CONSULTAS_CRITICAS = {
+    'asistencia por votación': ('SELECT * FROM asistencia WHERE votacion_id=?', (1,)),
+    'asistentes activos': (
+        'SELECT id, accionista, representante, apoderado, acciones FROM asistencia '
+        'WHERE votacion_id=? AND estado IN ("PRESENCIAL","VIRTUAL")', (1,)),
+    'resumen de acciones': (
+        'SELECT estado, acciones FROM asistencia_resumen WHERE votacion_id=? AND registros > 0', (1,)),
+    'asistencia cambiada desde una versión': (
+        'SELECT * FROM asistencia WHERE votacion_id=? AND version > ?', (1, 0)),
+    'página de asistencia': (
+        'SELECT * FROM asistencia WHERE votacion_id=? AND id > ? ORDER BY id LIMIT 200', (1, 0)),
+    'página de asistencia por estado': (
+        'SELECT * FROM asistencia WHERE votacion_id=? AND estado=? AND id > ? ORDER BY id LIMIT 200',
+        (1, 'PRESENCIAL', 0)),
+    'página de usuarios': ('SELECT id, username, cedula, role FROM users ORDER BY username LIMIT 50', ()),
+    'votaciones de los usuarios de una página': (
+        'SELECT vu.user_id, v.nombre FROM usuarios_votacion vu JOIN votaciones v ON v.id = vu.votacion_id '
+        'WHERE vu.user_id IN (1, 2, 3)', ()),
+    'preguntas de votación': ('SELECT id, texto FROM preguntas WHERE votacion_id=?', (1,)),
+    'opciones de pregunta': ('SELECT id, texto FROM opciones WHERE pregunta_id=?', (1,)),
+    'votos por opción': ('SELECT SUM(acciones) FROM votos WHERE opcion_id=?', (1,)),
+    'votos por votación': ('SELECT * FROM votos WHERE votacion_id=? AND pregunta_id=?', (1, 1)),
+    'padrón de la votación': ('SELECT id, acciones, estado FROM asistencia WHERE votacion_id=?', (1,)),
+    'votaciones del usuario': (
+        '''SELECT v.* FROM votaciones v JOIN usuarios_votacion vu ON v.id = vu.votacion_id
+           WHERE vu.user_id = ? AND vu.rol = ?''', (1, 'votante')),
+}
+
+
+def aplicar_migraciones(conn):
+    """Aplica las migraciones pendientes según ``PRAGMA user_version``."""
+    actual = conn.execute('PRAGMA user_version').fetchone()[0]
+    for version, descripcion, sql in MIGRACIONES:
+        if version <= actual:
+            continue
+        try:
+            conn.executescript(f'BEGIN;\n{sql}\nPRAGMA user_version = {version};\nCOMMIT;')
+        except sqlite3.Error:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+        print(f"✅ Migración {version}: {descripcion}")
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def verificar_planes(conn):
+    """Devuelve las consultas críticas cuyo plan recorre una tabla sin índice."""
+    fallos = []
+    for nombre, (sql, params) in CONSULTAS_CRITICAS.items():
+        plan = [r[3] for r in conn.execute(f'EXPLAIN QUERY PLAN {sql}', params)]
+        if any(p.startswith('SCAN') and 'INDEX' not in p for p in plan):
+            fallos.append((nombre, plan))
+    return fallos
+
+
+def main(argv):
+    """Crea o actualiza ``db.sqlite`` en el directorio actual."""
+    conn = sqlite3.connect('db.sqlite')
+    c = conn.cursor()
+    crear_tablas(conn)
+    version = aplicar_migraciones(conn)
+
+    # Usuario administrador por defecto
+    c.execute("SELECT id FROM users WHERE username='admin'")
+    if not c.fetchone():
+        c.execute(
+            "INSERT INTO users (username, password, role) VALUES (?,?,?)",
+            ('admin', generate_password_hash('admin'), 'admin')
+        )
+
+    conn.commit()
+
+    if '--verificar' in argv:
+        fallos = verificar_planes(conn)
+        for nombre, plan in fallos:
+            print(f"❌ {nombre}: {' | '.join(plan)}")
+        if fallos:
+            conn.close()
+            raise SystemExit(1)
+        print(f"✅ {len(CONSULTAS_CRITICAS)} consultas críticas usan índices")
+
+    conn.close()
+    print(f'✅ DB inicializada en db.sqlite (esquema v{version})')
+
 
-conn.commit()
-conn.close()
-print('✅ DB inicializada en db.sqlite')
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,132 @@
+"""Relevo de mensajes entre procesos para el modo con varios workers.
+
+``LocalBroker`` es un intermediario mínimo, sin servicios externos, que
+reenvía cada mensaje publicado a todos los suscriptores conectados.
+``LocalBrokerManager`` lo usa como cola de mensajes de python-socketio, de
+modo que un evento emitido en un worker llega a los clientes de los demás.
+"""
+import threading
+import time
+from multiprocessing.connection import Client, Listener
+
+import socketio
+
+
+class LocalBroker:
+    """Intermediario publicar/suscribir sobre ``multiprocessing.connection``."""
+
+    def __init__(self, address=('127.0.0.1', 0), authkey=b''):
+        self._listener = Listener(address, authkey=authkey)
+        self.address = self._listener.address
+        self._subs = []
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def serve_forever(self):
+        while not self._closed:
+            try:
+                conn = self._listener.accept()
+            except OSError:
+                if self._closed:
+                    return
+                continue  # autenticación fallida u otro cliente defectuoso
+            threading.Thread(target=self._atender, args=(conn,), daemon=True).start()
+
+    def _atender(self, conn):
+        try:
+            rol = conn.recv()
+        except (EOFError, OSError):
+            conn.close()
+            return
+        if rol == 'sub':
+            with self._lock:
+                self._subs.append(conn)
+            return
+        try:
+            while True:
+                self._difundir(conn.recv())
+        except (EOFError, OSError):
+            conn.close()
+
+    def _difundir(self, mensaje):
+        # Un único lock serializa los envíos: cada suscriptor recibe los
+        # mensajes en el mismo orden
+        with self._lock:
+            for sub in list(self._subs):
+                try:
+                    sub.send(mensaje)
+                except OSError:
+                    self._subs.remove(sub)
+                    sub.close()
+
+    def close(self):
+        self._closed = True
+        self._listener.close()
+        with self._lock:
+            for sub in self._subs:
+                sub.close()
+            self._subs.clear()
+
+
+class LocalBrokerManager(socketio.PubSubManager):
+    """Gestor de clientes de python-socketio que publica a través de ``LocalBroker``.
+
+    Además de los mensajes de Socket.IO transporta mensajes propios de la
+    aplicación: ``handlers`` asocia un ``method`` a la función que lo atiende en
+    los demás procesos (por ejemplo, invalidar una caché local).
+    """
+    name = 'local'
+
+    def __init__(self, address, authkey=b'', channel='socketio', write_only=False, logger=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self.address = address
+        self.authkey = authkey
+        self.handlers = {}
+        self._pub = None
+        self._pub_lock = threading.Lock()
+
+    def _connect(self, rol):
+        conn = Client(self.address, authkey=self.authkey)
+        conn.send(rol)
+        return conn
+
+    def _publish(self, data):
+        with self._pub_lock:
+            for intento in range(2):
+                try:
+                    if self._pub is None:
+                        self._pub = self._connect('pub')
+                    self._pub.send(data)
+                    return
+                except (EOFError, OSError):
+                    self._pub = None
+                    if intento:
+                        raise
+
+    def _listen(self):
+        while True:
+            try:
+                conn = self._connect('sub')
+            except OSError:
+                time.sleep(1)
+                continue
+            try:
+                while True:
+                    data = conn.recv()
+                    handler = self.handlers.get(data.get('method')) if isinstance(data, dict) else None
+                    if handler is None:
+                        yield data
+                    elif data.get('host_id') != self.host_id:
+                        handler(data)
+            except (EOFError, OSError):
+                time.sleep(1)
+            finally:
+                conn.close()
+
+    def publicar(self, method, **datos):
+        """Envía un mensaje de aplicación al resto de procesos."""
+        self._publish({'method': method, 'host_id': self.host_id, **datos})
@@ -0,0 +1,56 @@
+"""Generación del reporte PDF de asistencia y resultados.
+
+Se ejecuta en un proceso aparte (ver ``app.ReporteCache.obtener``, al que llama
+``/export/pdf``): matplotlib tarda en importarse y en dibujar, y dentro del
+hilo de la petición bloquearía al servidor Socket.IO. Las funciones reciben
+solo datos simples (listas y diccionarios) para poder enviarse entre procesos.
+"""
+import importlib.util
+from io import BytesIO
+
+HAS_MPL = importlib.util.find_spec('matplotlib') is not None
+
+ESTADOS = ('PRESENCIAL', 'VIRTUAL', 'AUSENTE')
+
+
+def renderizar_pdf(datos):
+    """Dibuja el reporte y devuelve el PDF como ``bytes``.
+
+    ``datos`` contiene ``titulo``, ``por_estado`` (``{estado: {registros,
+    acciones}}``), ``acciones_activas`` y ``preguntas`` con el mismo formato
+    que ``/api/resultados``.
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    from matplotlib.backends.backend_pdf import PdfPages
+
+    por_estado = datos['por_estado']
+    estados = [e for e in ESTADOS if por_estado.get(e, {}).get('registros')]
+    output = BytesIO()
+    with PdfPages(output) as pdf:
+        fig, (ax, ax2) = plt.subplots(1, 2, figsize=(8.27, 4))
+        fig.suptitle(datos['titulo'])
+        if estados:
+            ax.pie([por_estado[e]['registros'] for e in estados], labels=estados, autopct='%1.1f%%')
+        ax.set_title('Asistentes')
+        ax2.bar(ESTADOS, [por_estado.get(e, {}).get('acciones', 0) for e in ESTADOS])
+        ax2.set_ylabel('Total Acciones')
+        fig.tight_layout()
+        pdf.savefig(fig)
+        plt.close(fig)
+
+        for pregunta in datos['preguntas']:
+            opciones = pregunta['opciones']
+            fig, ax = plt.subplots(figsize=(8.27, 0.6 * len(opciones) + 1.5))
+            ax.barh([o['texto'] for o in opciones], [o['acciones'] for o in opciones])
+            ax.invert_yaxis()
+            for i, o in enumerate(opciones):
+                ax.annotate(f"{o['acciones']} ({o['porcentaje']:.1f}%)", (o['acciones'], i),
+                            xytext=(4, 0), textcoords='offset points', va='center')
+            ax.set_title(pregunta['texto'])
+            ax.set_xlabel(f"Acciones (activas: {datos['acciones_activas']})")
+            fig.tight_layout()
+            pdf.savefig(fig)
+            plt.close(fig)
+    return output.getvalue()
@@ -0,0 +1,193 @@
+// Panel de administración: pestañas y tablas paginadas cargadas bajo demanda
+
+document.addEventListener('DOMContentLoaded', () => {
+  const tabs = document.querySelectorAll('.tabs button');
+  const sections = document.querySelectorAll('.tab-section');
+  const tablas = {};
+
+  function esc(texto) {
+    const div = document.createElement('div');
+    div.textContent = texto == null ? '' : String(texto);
+    return div.innerHTML;
+  }
+
+  function botonEliminar(action, pregunta) {
+    return `<form method="post" action="${action}" style="display:inline" onsubmit="return confirm('${pregunta}');">` +
+           '<button type="submit">Eliminar</button></form>';
+  }
+
+  const filas = {
+    'tabla-usuarios': u => `
+      <td>${esc(u.username)}</td>
+      <td>${esc(u.cedula)}</td>
+      <td>${esc(u.role)}</td>
+      <td>${esc(u.votaciones.map(v => v.nombre).join(', '))}</td>
+      <td>${botonEliminar(`/admin/delete_user/${u.id}`, '¿Eliminar usuario?')}</td>`,
+    'tabla-votaciones': v => {
+      const nombres = (lista, total) => lista.length
+        ? `<br><small>${esc(lista.join(', '))}${total > lista.length ? ` y ${total - lista.length} más` : ''}</small>`
+        : '';
+      return `
+      <td>${esc(v.nombre)}</td>
+      <td>${esc(v.fecha)}</td>
+      <td>${v.preguntas}</td>
+      <td>${v.asistentes}${nombres(v.asistentes_nombres, v.asistentes)}</td>
+      <td>${v.votantes}${nombres(v.votantes_nombres, v.votantes)}</td>
+      <td>${esc(v.quorum_minimo)}</td>
+      <td>
+        <a href="/admin/votacion/${v.id}/edit">Editar</a>
+        ${botonEliminar(`/admin/votacion/${v.id}/delete`, '¿Eliminar votación?')}
+      </td>`;
+    }
+  };
+
+  // Estado de cada tabla: página, orden y búsqueda; se consulta al servidor
+  // en cada cambio y solo se mantiene la página visible
+  function crearTabla(tabla) {
+    const estado = { pagina: 1, orden: tabla.dataset.orden, dir: 'asc', q: '', consulta: 0 };
+    const paginador = document.querySelector(`.paginador[data-tabla="${tabla.id}"]`);
+    const buscar = document.querySelector(`.admin-buscar[data-tabla="${tabla.id}"]`);
+
+    async function cargar() {
+      const n = ++estado.consulta;
+      const params = new URLSearchParams({ pagina: estado.pagina, orden: estado.orden, dir: estado.dir });
+      if (estado.q) params.set('q', estado.q);
+      const resp = await fetch(`${tabla.dataset.url}?${params}`);
+      const data = await resp.json();
+      if (n !== estado.consulta) return;  // llegó una respuesta más nueva
+      if (!resp.ok) {
+        alert(data.error || 'Error al cargar');
+        return;
+      }
+      const tbody = tabla.querySelector('tbody');
+      tbody.innerHTML = '';
+      data.filas.forEach(f => {
+        const tr = document.createElement('tr');
+        tr.innerHTML = filas[tabla.id](f);
+        tbody.appendChild(tr);
+      });
+      const paginas = Math.max(1, Math.ceil(data.total / data.por_pagina));
+      paginador.innerHTML = `
+        <button type="button" data-pagina="${data.pagina - 1}" ${data.pagina <= 1 ? 'disabled' : ''}>Anterior</button>
+        Página ${data.pagina} de ${paginas} (${data.total})
+        <button type="button" data-pagina="${data.pagina + 1}" ${data.pagina >= paginas ? 'disabled' : ''}>Siguiente</button>`;
+      tabla.querySelectorAll('th[data-orden]').forEach(th => {
+        th.classList.toggle('orden-asc', th.dataset.orden === estado.orden && estado.dir === 'asc');
+        th.classList.toggle('orden-desc', th.dataset.orden === estado.orden && estado.dir === 'desc');
+      });
+    }
+
+    tabla.querySelectorAll('th[data-orden]').forEach(th => {
+      th.style.cursor = 'pointer';
+      th.addEventListener('click', () => {
+        estado.dir = estado.orden === th.dataset.orden && estado.dir === 'asc' ? 'desc' : 'asc';
+        estado.orden = th.dataset.orden;
+        estado.pagina = 1;
+        cargar();
+      });
+    });
+    paginador.addEventListener('click', (e) => {
+      if (!e.target.dataset.pagina) return;
+      estado.pagina = parseInt(e.target.dataset.pagina);
+      cargar();
+    });
+    let espera;
+    if (buscar) buscar.addEventListener('input', () => {
+      clearTimeout(espera);
+      espera = setTimeout(() => {
+        estado.q = buscar.value.trim();
+        estado.pagina = 1;
+        cargar();
+      }, 300);
+    });
+    return { cargar };
+  }
+
+  // Lista de usuarios del formulario de votación: muestra los resultados de
+  // la búsqueda y conserva las filas ya marcadas
+  const checklist = document.querySelector('#usuarios-votacion tbody');
+  const buscarAsignables = document.getElementById('buscar-usuarios-votacion');
+  let esperaAsignables;
+  async function cargarAsignables() {
+    const params = new URLSearchParams({ por_pagina: 100, orden: 'username' });
+    if (buscarAsignables.value.trim()) params.set('q', buscarAsignables.value.trim());
+    const data = await (await fetch(`/api/admin/usuarios?${params}`)).json();
+    const marcados = new Set();
+    checklist.querySelectorAll('tr').forEach(tr => {
+      if (tr.querySelector('input:checked')) marcados.add(tr.dataset.id);
+      else tr.remove();
+    });
+    data.filas.filter(u => !marcados.has(String(u.id))).forEach(u => {
+      const tr = document.createElement('tr');
+      tr.dataset.id = u.id;
+      tr.innerHTML = `
+        <td>${esc(u.username)}</td>
+        <td><input type="checkbox" class="rol-asistencia" value="${u.id}"></td>
+        <td><input type="checkbox" class="rol-votante" value="${u.id}"></td>`;
+      checklist.appendChild(tr);
+    });
+  }
+  if (buscarAsignables) buscarAsignables.addEventListener('input', () => {
+    clearTimeout(esperaAsignables);
+    esperaAsignables = setTimeout(cargarAsignables, 300);
+  });
+
+  // Importación masiva: el servidor procesa el archivo en segundo plano y
+  // aquí se consulta el avance hasta que termina
+  const archivoUsuarios = document.getElementById('archivoUsuarios');
+  const resultadoImportacion = document.getElementById('importacionUsuarios');
+  async function seguirImportacion(jobId) {
+    const job = await (await fetch(`/upload/jobs/${jobId}`)).json();
+    if (job.estado === 'en_curso') {
+      resultadoImportacion.textContent = `Creando usuarios: ${job.creados} de ${job.total || '?'}`;
+      setTimeout(() => seguirImportacion(jobId), 1000);
+      return;
+    }
+    if (job.estado === 'error') {
+      resultadoImportacion.textContent = `Error: ${job.error}`;
+      return;
+    }
+    const errores = job.reporte.filter(f => f.estado === 'error');
+    resultadoImportacion.innerHTML =
+      `<p>Creados ${job.creados} de ${job.total} usuarios en ${job.segundos} s ` +
+      `(${job.asignaciones} asignaciones a votaciones).</p>` +
+      (errores.length
+        ? '<table><thead><tr><th>Fila</th><th>Usuario</th><th>Error</th></tr></thead><tbody>' +
+          errores.map(f => `<tr><td>${f.fila}</td><td>${esc(f.username)}</td><td>${esc(f.error)}</td></tr>`).join('') +
+          '</tbody></table>'
+        : '');
+    if (tablas['tabla-usuarios']) tablas['tabla-usuarios'].cargar();
+  }
+  const importarUsuarios = document.getElementById('importarUsuarios');
+  if (importarUsuarios) importarUsuarios.addEventListener('click', async () => {
+    if (!archivoUsuarios.files.length) return;
+    const formData = new FormData();
+    formData.append('file', archivoUsuarios.files[0]);
+    const resp = await fetch('/admin/usuarios/importar', { method: 'POST', body: formData });
+    const data = await resp.json().catch(() => ({}));
+    if (!resp.ok) {
+      alert(data.error || 'Error al importar');
+      return;
+    }
+    archivoUsuarios.value = '';
+    seguirImportacion(data.job_id);
+  });
+
+  const cargados = new Set();
+  function mostrar(id) {
+    tabs.forEach(b => b.classList.toggle('active', b.dataset.tab === id));
+    sections.forEach(s => s.classList.toggle('hidden', s.id !== id));
+    // Cada pestaña consulta sus datos la primera vez que se abre
+    if (cargados.has(id)) return;
+    cargados.add(id);
+    document.getElementById(id).querySelectorAll('table[data-url]').forEach(t => {
+      tablas[t.id] = tablas[t.id] || crearTabla(t);
+      tablas[t.id].cargar();
+    });
+    if (id === 'votaciones' && checklist) cargarAsignables();
+  }
+
+  tabs.forEach(btn => btn.addEventListener('click', () => mostrar(btn.dataset.tab)));
+  const activa = document.querySelector('.tabs button.active');
+  if (activa) mostrar(activa.dataset.tab);
+});
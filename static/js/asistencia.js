@@ -36,27 +36,100 @@ document.addEventListener('DOMContentLoaded', () => {
     }
   });
 
+  const loadMore = document.getElementById('loadMore');
+  const PAGINA = 200;
+
+  // Solo se mantienen en memoria las páginas mostradas; el filtrado, la
+  // búsqueda y los totales se resuelven en el servidor
   let rows = [];
+  let rowsById = new Map();
+  let siguiente = null;
+  let version = 0;
+  let consulta = 0;
   const changed = new Map();
 
-  function load() {
+  function parametros(extra) {
+    const params = new URLSearchParams({ votacion_id: votacionSelect.value, limit: PAGINA, ...extra });
+    if (filter.value) params.set('estado', filter.value);
+    if (search.value.trim()) params.set('q', search.value.trim());
+    return params;
+  }
+
+  // Pide la primera página (o la siguiente si `mas`) con el filtro actual
+  function consultar(mas = false) {
     if (!votacionSelect.value) return;
-    fetch(`/api/asistencia?votacion_id=${votacionSelect.value}`)
+    if (mas && !siguiente) return;
+    const id = mas ? consulta : ++consulta;
+    fetch(`/api/asistencia?${parametros(mas ? { cursor: siguiente } : {})}`)
       .then(r => r.json())
-      .then(data => { rows = data; render(); });
+      .then(res => {
+        if (id !== consulta) return;  // respuesta de una búsqueda anterior
+        if (mas) {
+          rows = rows.concat(res.filas);
+        } else {
+          rows = res.filas;
+          version = res.version;
+        }
+        rowsById = new Map(rows.map(r => [r.id, r]));
+        siguiente = res.siguiente;
+        render();
+      });
+  }
+
+  // Trae los cambios posteriores a la versión local; si son demasiados o hubo
+  // una importación, vuelve a pedir la página
+  function sincronizar() {
+    const votacion = votacionSelect.value;
+    if (!votacion) return;
+    fetch(`/api/asistencia?votacion_id=${votacion}&since=${version}&limit=${PAGINA}`)
+      .then(r => r.json())
+      .then(res => {
+        if (votacion !== votacionSelect.value) return;
+        if (res.reinicio) return consultar();
+        res.filas.forEach(f => {
+          const record = rowsById.get(f.id);
+          if (record) Object.assign(record, f);
+        });
+        version = res.version;
+        render();
+      });
+    cargarResumen();
+  }
+
+  let totales = { counts: { PRESENCIAL: 0, VIRTUAL: 0, AUSENTE: 0 }, acciones: { PRESENCIAL: 0, VIRTUAL: 0, AUSENTE: 0 } };
+
+  function cargarResumen() {
+    if (!votacionSelect.value) return;
     fetch(`/api/asistencia/resumen?votacion_id=${votacionSelect.value}`)
       .then(r => r.json())
-      .then(res => { quorumInput.value = res.quorum_minimo || 0; render(); });
+      .then(res => {
+        quorumInput.value = res.quorum_minimo || 0;
+        quorumInput.style.borderColor = res.quorum_cumplido ? 'green' : 'red';
+        ['PRESENCIAL', 'VIRTUAL', 'AUSENTE'].forEach(e => {
+          totales.counts[e] = res.por_estado[e].registros;
+          totales.acciones[e] = res.por_estado[e].acciones;
+        });
+        const { counts } = totales;
+        summary.textContent = `${counts.PRESENCIAL} presenciales / ${counts.VIRTUAL} virtuales / ${counts.AUSENTE} ausentes`;
+        renderCharts(totales);
+      });
+  }
+
+  let resumenPendiente = null;
+  function refrescarResumen() {
+    clearTimeout(resumenPendiente);
+    resumenPendiente = setTimeout(cargarResumen, 500);
+  }
+
+  function load() {
+    if (!votacionSelect.value) return;
+    consultar();
+    cargarResumen();
   }
 
   function render() {
     tbody.innerHTML = '';
-    const counts = { PRESENCIAL: 0, VIRTUAL: 0, AUSENTE: 0 };
-    const acciones = { PRESENCIAL: 0, VIRTUAL: 0, AUSENTE: 0 };
     rows.forEach(r => {
-      if (filter.value && r.estado !== filter.value) return;
-      const cadena = `${r.accionista || ''} ${r.representante || ''} ${r.apoderado || ''}`.toLowerCase();
-      if (search.value && !cadena.includes(search.value.toLowerCase())) return;
       const tr = document.createElement('tr');
       tr.dataset.id = r.id;
       const currentEstado = changed.get(r.id) || r.estado;
@@ -80,16 +153,8 @@ document.addEventListener('DOMContentLoaded', () => {
         });
       }
       tbody.appendChild(tr);
-      counts[currentEstado] = (counts[currentEstado] || 0) + 1;
-      acciones[currentEstado] = (acciones[currentEstado] || 0) + (r.acciones || 0);
     });
-    summary.textContent = `${counts.PRESENCIAL} presenciales / ${counts.VIRTUAL} virtuales / ${counts.AUSENTE} ausentes`;
-
-    renderCharts({ counts, acciones });
-
-    const totalPresentes = counts.PRESENCIAL + counts.VIRTUAL;
-    const quorum = parseInt(quorumInput.value || '0', 10);
-    quorumInput.style.borderColor = totalPresentes >= quorum ? 'green' : 'red';
+    if (loadMore) loadMore.style.display = siguiente ? '' : 'none';
   }
 
   function renderCharts(stats) {
@@ -99,57 +164,88 @@ document.addEventListener('DOMContentLoaded', () => {
     barChart.update();
   }
 
-  socket.on('estado_changed', ({ id, estado }) => {
-    const row = tbody.querySelector(`tr[data-id="${id}"]`);
-    const record = rows.find(r => r.id === id);
+  function aplicarEstado(id, estado) {
+    const record = rowsById.get(id);
     if (record) record.estado = estado;
-    if (row) {
-      const select = row.querySelector('select.estado');
-      if (select) select.value = estado;
+  }
+
+  // El servidor agrupa los cambios de cada ventana corta en un único mensaje
+  // Si falta algún cambio anterior (desde > versión local) se piden las diferencias
+  socket.on('estados_changed', ({ votacion_id, cambios, todos, desde, version: nueva }) => {
+    if (String(votacion_id) !== votacionSelect.value) return;
+    if (nueva !== undefined) {
+      if (nueva <= version) return;
+      if (desde > version) return sincronizar();
+      version = nueva;
     }
+    if (todos) rows.forEach(r => { r.estado = todos; });
+    Object.entries(cambios || {}).forEach(([estado, ids]) => ids.forEach(id => aplicarEstado(id, estado)));
     render();
+    refrescarResumen();
+  });
+
+  socket.on('asistencia_recargada', ({ votacion_id }) => {
+    if (String(votacion_id) === votacionSelect.value) load();
+  });
+
+  function unirse() {
+    if (votacionSelect.value) socket.emit('unirse', { votacion_id: Number(votacionSelect.value) });
+  }
+  // Al reconectar solo se descargan los cambios ocurridos mientras tanto
+  socket.on('connect', () => {
+    unirse();
+    if (version) sincronizar();
   });
 
   async function guardar() {
     if (!changed.size) return;
-    const peticiones = Array.from(changed.entries()).map(([id, estado]) =>
-      fetch(`/api/asistencia/${id}?votacion_id=${votacionSelect.value}`, {
+    const cambios = Array.from(changed.entries()).map(([id, estado]) => ({ id, estado }));
+    try {
+      const resp = await fetch(`/api/asistencia/bulk?votacion_id=${votacionSelect.value}`, {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ estado })
-      })
-    );
-    try {
-      await Promise.all(peticiones);
+        body: JSON.stringify({ cambios })
+      });
+      if (!resp.ok) throw new Error(resp.statusText);
+      cambios.forEach(({ id, estado }) => aplicarEstado(id, estado));
       changed.clear();
+      render();
+      refrescarResumen();
     } catch (err) {
       console.error(err);
       alert('Error al guardar cambios');
     }
   }
 
-  if (!READONLY) {
-    document.getElementById('markAll').addEventListener('click', () => {
-      tbody.querySelectorAll('select.estado').forEach(s => {
-        s.value = 'PRESENCIAL';
-        changed.set(s.closest('tr').dataset.id, s.value);
-      });
-      render();
-    });
-    document.getElementById('markVirtual').addEventListener('click', () => {
-      tbody.querySelectorAll('select.estado').forEach(s => {
-        s.value = 'VIRTUAL';
-        changed.set(s.closest('tr').dataset.id, s.value);
-      });
-      render();
-    });
-    document.getElementById('clearAll').addEventListener('click', () => {
-      tbody.querySelectorAll('select.estado').forEach(s => {
-        s.value = 'AUSENTE';
-        changed.set(s.closest('tr').dataset.id, s.value);
+  // Marca todas las filas del filtro actual, no solo las páginas cargadas: sin
+  // filtro ni búsqueda el servidor asigna el estado a toda la votación
+  async function marcarTodos(estado) {
+    const q = search.value.trim();
+    const alcance = filter.value || q ? 'las filas del filtro actual' : 'toda la votación';
+    if (!confirm(`¿Marcar ${alcance} como ${estado}?`)) return;
+    const body = { estado };
+    if (filter.value || q) body.filtro = { estado: filter.value, q };
+    try {
+      const resp = await fetch(`/api/asistencia/bulk?votacion_id=${votacionSelect.value}`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify(body)
       });
-      render();
-    });
+      if (!resp.ok) throw new Error(resp.statusText);
+      // Los cambios pendientes de las filas marcadas quedan reemplazados
+      if (body.filtro) rows.forEach(r => changed.delete(r.id)); else changed.clear();
+      consultar();
+      refrescarResumen();
+    } catch (err) {
+      console.error(err);
+      alert('Error al guardar cambios');
+    }
+  }
+
+  if (!READONLY) {
+    document.getElementById('markAll').addEventListener('click', () => marcarTodos('PRESENCIAL'));
+    document.getElementById('markVirtual').addEventListener('click', () => marcarTodos('VIRTUAL'));
+    document.getElementById('clearAll').addEventListener('click', () => marcarTodos('AUSENTE'));
   }
 
   document.getElementById('exportExcel').addEventListener('click', () => window.location = `/export/excel?votacion_id=${votacionSelect.value}`);
@@ -157,18 +253,39 @@ document.addEventListener('DOMContentLoaded', () => {
   document.getElementById('exportPdf').addEventListener('click', () => window.location = `/export/pdf?votacion_id=${votacionSelect.value}`);
   if (templateBtn) templateBtn.addEventListener('click', () => window.location = '/template/asistencia');
 
+  const importProgress = document.getElementById('importProgress');
+  let importJob = null;
+
+  function onProgreso(job) {
+    if (!importJob || job.job_id !== importJob) return;
+    if (importProgress) importProgress.textContent = `${job.filas} filas procesadas`;
+    if (job.estado === 'completado') {
+      importJob = null;
+      let msg = `Importación exitosa: ${job.filas} filas en ${job.segundos} s`;
+      if (job.total_errores) msg += `\n${job.total_errores} observaciones (ver /upload/jobs/${job.job_id})`;
+      alert(msg);
+    } else if (job.estado === 'error') {
+      importJob = null;
+      alert(job.error || 'Error al importar');
+    }
+  }
+
+  socket.on('importacion_progreso', onProgreso);
+
   if (uploadBtn) uploadBtn.addEventListener('click', () => {
     const file = uploadInput.files[0];
     if (!file) return alert('Seleccione un archivo');
     const fd = new FormData();
     fd.append('file', file);
     fd.append('votacion_id', votacionSelect.value);
-    fetch('/upload', { method: 'POST', body: fd })
+    fetch('/upload/stream', { method: 'POST', body: fd })
       .then(r => r.json())
       .then(res => {
-        if (res.ok) {
-          alert('Importación exitosa');
-          load();
+        if (res.job_id) {
+          importJob = res.job_id;
+          if (importProgress) importProgress.textContent = 'Importando...';
+          // Por si la importación terminó antes de recibir el identificador
+          fetch(`/upload/jobs/${res.job_id}`).then(r => r.json()).then(onProgreso);
         } else {
           alert(res.error || 'Error al importar');
         }
@@ -176,9 +293,14 @@ document.addEventListener('DOMContentLoaded', () => {
   });
 
   if (!READONLY) document.getElementById('save').addEventListener('click', guardar);
-  search.addEventListener('input', render);
-  filter.addEventListener('change', render);
-  if (votacionSelect) votacionSelect.addEventListener('change', load);
+  let busquedaPendiente = null;
+  search.addEventListener('input', () => {
+    clearTimeout(busquedaPendiente);
+    busquedaPendiente = setTimeout(() => consultar(), 300);
+  });
+  filter.addEventListener('change', () => consultar());
+  if (loadMore) loadMore.addEventListener('click', () => consultar(true));
+  if (votacionSelect) votacionSelect.addEventListener('change', () => { unirse(); load(); });
 
   // Reloj y auto guardado
   setInterval(() => {
@@ -4,6 +4,19 @@ document.addEventListener('DOMContentLoaded', () => {
   let asistentes = [];
   let preguntas = [];
 
+  const socket = io();
+  socket.on('connect', () => socket.emit('unirse', { votacion_id: Number(votacionId) }));
+  const aviso = () => {
+    if (document.getElementById('avisoAsistencia')) return;
+    const div = document.createElement('div');
+    div.id = 'avisoAsistencia';
+    div.className = 'aviso';
+    div.textContent = 'La asistencia cambió; recargue la página para actualizar la lista de asistentes.';
+    app.before(div);
+  };
+  socket.on('estados_changed', aviso);
+  socket.on('asistencia_recargada', aviso);
+
   async function load() {
     const [a, p] = await Promise.all([
       fetch(`/api/votacion/${votacionId}/asistentes`).then(r => r.json()),
@@ -35,6 +48,7 @@ document.addEventListener('DOMContentLoaded', () => {
       const tbody = document.createElement('tbody');
       asistentes.forEach(a => {
         const tr = document.createElement('tr');
+        tr.dataset.asistencia = a.id;
         tr.dataset.acciones = a.acciones;
         const nombre = a.accionista || a.representante || a.apoderado || '';
         tr.innerHTML = `<td>${nombre}</td>`;
@@ -80,30 +94,32 @@ document.addEventListener('DOMContentLoaded', () => {
 
   async function guardar(p, div) {
     const key = `votacion_${votacionId}_p${p.id}`;
-    const peticiones = [];
+    const votos = [];
     div.querySelectorAll('tbody tr').forEach(tr => {
       const opcion = tr.querySelector('select.voto').value;
       if (!opcion) return;
+      // El servidor toma las acciones del registro de asistencia; se envían
+      // para detectar una lista desactualizada
       const acciones = parseInt(tr.dataset.acciones || '0', 10);
-      peticiones.push(fetch('/api/votar', {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({
-          votacion_id: votacionId,
-          pregunta_id: p.id,
-          opcion_id: parseInt(opcion,10),
-          acciones
-        })
-      }));
+      votos.push({ asistencia_id: parseInt(tr.dataset.asistencia, 10), opcion_id: parseInt(opcion, 10), acciones });
     });
+    if (!votos.length) return;
     try {
-      await Promise.all(peticiones);
+      const resp = await fetch('/api/votar/batch', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ votacion_id: votacionId, pregunta_id: p.id, votos })
+      });
+      if (!resp.ok) {
+        const res = await resp.json().catch(() => ({}));
+        throw new Error(res.error || resp.statusText);
+      }
       localStorage.setItem(key, '1');
       div.classList.add('votada');
       div.querySelector('button').disabled = true;
       alert('Votos registrados');
     } catch (e) {
-      alert('Error al registrar votos');
+      alert(`Error al registrar votos: ${e.message}`);
     }
   }
 
@@ -36,6 +36,8 @@ document.addEventListener('DOMContentLoaded', () => {
   function createPregunta(data = null) {
     const preguntaDiv = document.createElement('div');
     preguntaDiv.className = 'pregunta';
+    // El id de lo ya guardado permite al servidor actualizar en lugar de recrear
+    if (data && data.id) preguntaDiv.dataset.id = data.id;
 
     const header = document.createElement('div');
     header.className = 'pregunta-header';
@@ -77,10 +79,11 @@ document.addEventListener('DOMContentLoaded', () => {
       data.opciones.forEach(opt => {
         const opcionDiv = document.createElement('div');
         opcionDiv.className = 'opcion';
+        if (opt.id) opcionDiv.dataset.id = opt.id;
         const input = document.createElement('input');
         input.type = 'text';
         input.placeholder = 'Opción';
-        input.value = opt;
+        input.value = typeof opt === 'string' ? opt : opt.texto;
         opcionDiv.appendChild(input);
         const removeBtn = document.createElement('button');
         removeBtn.type = 'button';
@@ -108,8 +111,10 @@ document.addEventListener('DOMContentLoaded', () => {
     const quorum = parseFloat(document.getElementById('quorum_minimo').value || '0');
     const preguntas = Array.from(preguntasContainer.children).map(p => {
       const texto = p.querySelector('.pregunta-texto').value;
-      const opciones = Array.from(p.querySelectorAll('.opcion input')).map(i => i.value).filter(v => v);
-      return { texto, opciones };
+      const opciones = Array.from(p.querySelectorAll('.opcion'))
+        .map(o => ({ id: o.dataset.id ? Number(o.dataset.id) : null, texto: o.querySelector('input').value }))
+        .filter(o => o.texto);
+      return { id: p.dataset.id ? Number(p.dataset.id) : null, texto, opciones };
     }).filter(p => p.texto);
 
     const votantes = Array.from(document.querySelectorAll('.rol-votante:checked')).map(cb => cb.value);
@@ -125,7 +130,8 @@ document.addEventListener('DOMContentLoaded', () => {
     if (resp.ok) {
       window.location.href = '/panel_admin';
     } else {
-      alert('Error al guardar');
+      const res = await resp.json().catch(() => ({}));
+      alert(res.error || 'Error al guardar');
     }
   });
 
@@ -0,0 +1,19 @@
+"""Prueba de las migraciones de ``db_init.py`` sobre una base nueva.
+
+Uso::
+
+    python -m pytest -q test_db_init.py
+"""
+import sqlite3
+
+import db_init
+
+
+def test_migraciones_dejan_indices_para_las_consultas_criticas(tmp_path):
+    conn = sqlite3.connect(tmp_path / 'db.sqlite')
+    try:
+        db_init.crear_tablas(conn)
+        assert db_init.aplicar_migraciones(conn) == db_init.MIGRACIONES[-1][0]
+        assert db_init.verificar_planes(conn) == []
+    finally:
+        conn.close()
@@ -0,0 +1,208 @@
+"""Prueba de extremo a extremo del modo con varios workers (``mensajeria.py``).
+
+Levanta el broker y dos procesos de ``app.py`` sobre una base temporal y
+comprueba que lo publicado por un worker llega al otro: las invalidaciones de
+caché (aunque ese worker no haya atendido nunca una conexión Socket.IO) y los
+eventos Socket.IO emitidos a la sala de una votación.
+
+Uso::
+
+    python -m pytest -q test_mensajeria.py
+"""
+import http.cookiejar
+import json
+import os
+import secrets
+import shutil
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+import pytest
+
+from mensajeria import LocalBroker
+
+DIRECTORIO = os.path.dirname(os.path.abspath(__file__))
+
+
+class _SinRedireccion(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class Cliente:
+    """Cliente HTTP con cookies que no sigue redirecciones."""
+
+    def __init__(self, puerto):
+        self.base = f'http://127.0.0.1:{puerto}'
+        self._opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), _SinRedireccion)
+
+    def pedir(self, ruta, datos=None, json_=None, crudo=None, timeout=10):
+        """Devuelve ``(status, cuerpo)``; los 3xx y 4xx no lanzan excepción."""
+        cabeceras = {}
+        if json_ is not None:
+            cuerpo = json.dumps(json_).encode()
+            cabeceras['Content-Type'] = 'application/json'
+        elif crudo is not None:
+            cuerpo = crudo.encode()
+            cabeceras['Content-Type'] = 'text/plain;charset=UTF-8'
+        else:
+            cuerpo = urllib.parse.urlencode(datos).encode() if datos is not None else None
+        peticion = urllib.request.Request(self.base + ruta, cuerpo, cabeceras)
+        try:
+            with self._opener.open(peticion, timeout=timeout) as resp:
+                return resp.status, resp.read()
+        except urllib.error.HTTPError as exc:
+            return exc.code, exc.read()
+
+    def login(self, usuario, contrasena):
+        status, _ = self.pedir('/login', {'username': usuario, 'password': contrasena})
+        assert status == 302, f'login de {usuario} falló ({status})'
+
+
+class ClienteSocketIO:
+    """Cliente Socket.IO mínimo por long-polling (Engine.IO v4) sobre ``Cliente``.
+
+    Comparte las cookies de sesión del ``Cliente``; basta para unirse a una
+    sala y leer los eventos que el servidor envía.
+    """
+
+    def __init__(self, cliente):
+        self.cliente = cliente
+        status, cuerpo = cliente.pedir('/socket.io/?EIO=4&transport=polling')
+        assert status == 200 and cuerpo.startswith(b'0'), cuerpo
+        self.ruta = f'/socket.io/?EIO=4&transport=polling&sid={json.loads(cuerpo[1:])["sid"]}'
+        self.enviar('40')
+        assert any(p.startswith('40') for p in self.recibir())
+
+    def enviar(self, paquete):
+        assert self.cliente.pedir(self.ruta, crudo=paquete)[0] == 200
+
+    def recibir(self):
+        """Paquetes de la siguiente respuesta de long-polling (espera hasta que haya alguno)."""
+        status, cuerpo = self.cliente.pedir(self.ruta, timeout=30)
+        assert status == 200, cuerpo
+        return cuerpo.decode().split('\x1e')
+
+    def emitir(self, evento, datos, ack_id=1):
+        """Emite ``evento`` y devuelve la respuesta (ack) del servidor."""
+        self.enviar(f'42{ack_id}' + json.dumps([evento, datos]))
+        while True:
+            for paquete in self.recibir():
+                if paquete.startswith(f'43{ack_id}'):
+                    return json.loads(paquete[2 + len(str(ack_id)):])[0]
+
+    def esperar_evento(self, evento, limite=10):
+        fin = time.monotonic() + limite
+        while time.monotonic() < fin:
+            for paquete in self.recibir():
+                if paquete == '2':  # ping del servidor
+                    self.enviar('3')
+                elif paquete.startswith('42'):
+                    nombre, *datos = json.loads(paquete[2:])
+                    if nombre == evento:
+                        return datos[0] if datos else None
+        raise AssertionError(f'no llegó el evento {evento}')
+
+
+def _puerto_libre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _esperar(puerto, limite=20):
+    fin = time.monotonic() + limite
+    while time.monotonic() < fin:
+        try:
+            urllib.request.urlopen(f'http://127.0.0.1:{puerto}/login', timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise AssertionError(f'el worker del puerto {puerto} no arrancó')
+
+
+@pytest.fixture
+def workers():
+    """Broker y dos workers sobre una base nueva; devuelve ``(directorio, puertos)``."""
+    tmp = tempfile.mkdtemp()
+    clave = secrets.token_bytes(32)
+    broker = LocalBroker(('127.0.0.1', 0), authkey=clave).start()
+    host, port = broker.address
+    puertos = [_puerto_libre(), _puerto_libre()]
+    env = dict(os.environ, SOCKETIO_BROKER=f'{host}:{port}', SOCKETIO_BROKER_KEY=clave.hex(),
+               SECRET_KEY='prueba-mensajeria')
+    procesos = []
+    try:
+        subprocess.run([sys.executable, os.path.join(DIRECTORIO, 'db_init.py')],
+                       cwd=tmp, check=True, capture_output=True)
+        for puerto in puertos:
+            procesos.append(subprocess.Popen(
+                [sys.executable, os.path.join(DIRECTORIO, 'app.py'), '--port', str(puerto)],
+                cwd=tmp, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL))
+        for puerto in puertos:
+            _esperar(puerto)
+        yield tmp, puertos
+    finally:
+        for p in procesos:
+            p.terminate()
+        for p in procesos:
+            p.wait()
+        broker.close()
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def test_invalidacion_entre_workers_sin_socketio(workers):
+    _, puertos = workers
+    admin = Cliente(puertos[1])
+    admin.login('admin', 'admin')
+    status, _ = admin.pedir('/admin/create_user', {
+        'username': 'votante1', 'password': 'clave', 'role': 'votante', 'cedula': '1'})
+    assert status in (200, 302)
+
+    # El worker A deja el usuario en su caché (UsuarioCache, 30 s de TTL)
+    votante = Cliente(puertos[0])
+    votante.login('votante1', 'clave')
+    assert votante.pedir('/panel_votacion')[0] == 200
+
+    # El worker B lo elimina y publica la invalidación por el broker
+    status, cuerpo = admin.pedir('/api/admin/usuarios?q=votante1')
+    user_id = json.loads(cuerpo)['filas'][0]['id']
+    assert admin.pedir(f'/admin/delete_user/{user_id}', {})[0] == 302
+
+    fin = time.monotonic() + 5
+    while votante.pedir('/panel_votacion')[0] == 200:
+        assert time.monotonic() < fin, 'el worker A sigue aceptando al usuario eliminado'
+        time.sleep(0.1)
+
+
+def test_evento_de_un_worker_llega_a_cliente_de_otro(workers):
+    tmp, puertos = workers
+    with sqlite3.connect(os.path.join(tmp, 'db.sqlite')) as conn:
+        votacion_id = conn.execute("INSERT INTO votaciones (nombre) VALUES ('Junta')").lastrowid
+        conn.executemany(
+            "INSERT INTO asistencia (votacion_id, accionista, acciones, estado) VALUES (?, ?, 10, 'AUSENTE')",
+            [(votacion_id, f'Accionista {i}') for i in range(3)])
+
+    # Un cliente conectado al worker B se une a la sala de la votación
+    en_b = Cliente(puertos[1])
+    en_b.login('admin', 'admin')
+    socket_b = ClienteSocketIO(en_b)
+    assert socket_b.emitir('unirse', {'votacion_id': votacion_id}) == {'ok': True}
+
+    # El cambio se hace en el worker A
+    en_a = Cliente(puertos[0])
+    en_a.login('admin', 'admin')
+    status, cuerpo = en_a.pedir(f'/api/asistencia/bulk?votacion_id={votacion_id}', json_={'estado': 'PRESENCIAL'})
+    assert status == 200 and json.loads(cuerpo)['actualizados'] == 3
+
+    evento = socket_b.esperar_evento('estados_changed')
+    assert evento['votacion_id'] == votacion_id
+    assert evento['todos'] == 'PRESENCIAL'